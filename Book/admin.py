@@ -3,3 +3,4 @@ import Book.models
 
 admin.site.register(Book.models.Book)
 admin.site.register(Book.models.BookRequest)
+admin.site.register(Book.models.KeywordJob)
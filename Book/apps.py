@@ -1,5 +1,4 @@
 from django.apps import AppConfig
-import requests
 from django.conf import settings
 
 
@@ -11,12 +10,13 @@ class BookConfig(AppConfig):
         import Book.signals as signals
         if settings.USE_FLASK_SERVER:
             from Book.models import Book
+            from Book.utils.recommender_client import recommender_client
 
             try:
                 req = {}
                 for item in Book.objects.all():
                     req[item.book_id] = str(item.description)
-                response = requests.post(settings.FLASK_SERVER_ADDRESS + '/init_model', json=req)
+                response = recommender_client.post('/init_model', json=req, timeout=settings.RECOMMENDER_INIT_TIMEOUT)
             except Exception as e:
                 print(e)
 
@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from Book.models import Book
+from Book.utils.book_search_index import BookSearchIndex
+
+WORDS = ['کتاب', 'تاریخ', 'ایران', 'رمان', 'شعر', 'داستان', 'علم', 'فلسفه', 'هنر', 'جنگ',
+         'صلح', 'زندگی', 'عشق', 'سفر', 'دریا', 'کوه', 'شهر', 'روستا', 'کودک', 'مادر']
+
+
+class Command(BaseCommand):
+    help = 'Compares the LIKE scans of SearchFilter with BookSearchIndex on a temporary catalog that is rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        vocabulary = WORDS + [f'{word}{i}' for word in WORDS for i in range(50)]
+        queries = [' '.join(rng.sample(vocabulary, rng.randint(1, 2))) for _ in range(options['repeat'])]
+        self.stdout.write(f"{'books':>8} {'like ms':>9} {'index ms':>9} {'build s':>8} {'reload s':>9}")
+        for books in options['books']:
+            with transaction.atomic():
+                self.fill(books, vocabulary, rng)
+                like = self.time(queries, lambda query: list(self.like(query)[:options['limit']]))
+                index = BookSearchIndex()
+                started = time.perf_counter()
+                index.refresh()
+                build = time.perf_counter() - started
+                started = time.perf_counter()
+                index.refresh()
+                reload = time.perf_counter() - started
+                ranked = self.time(queries, lambda query: list(
+                    Book.objects.filter(book_id__in=[book_id for book_id, _ in index.search(query, options['limit'])])
+                ))
+                self.stdout.write(f'{books:>8} {like * 1000:>9.2f} {ranked * 1000:>9.2f} {build:>8.2f} {reload:>9.2f}')
+                transaction.set_rollback(True)
+
+    def like(self, query):
+        # what SearchFilter runs for search_fields = ['name', 'description', 'author']
+        queryset = Book.objects.all()
+        for term in query.split():
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term) | Q(author__icontains=term))
+        return queryset.order_by('-created_at')
+
+    def fill(self, books, vocabulary, rng):
+        donator = get_user_model().objects.create_user(
+            email='benchmark@example.com', password='benchmark', name='benchmark', phone_number='0'
+        )
+        Book.objects.bulk_create(
+            (Book(name=' '.join(rng.sample(vocabulary, 3)), description=' '.join(rng.choices(vocabulary, k=30)),
+                  author=rng.choice(vocabulary), donator=donator) for _ in range(books)),
+            batch_size=5000,
+        )
+
+    def time(self, queries, function):
+        started = time.perf_counter()
+        for query in queries:
+            function(query)
+        return (time.perf_counter() - started) / len(queries)
@@ -0,0 +1,49 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from Book.models import Book
+from Book.utils.random_book_sampler import RandomBookSampler
+
+
+class Command(BaseCommand):
+    help = 'Compares order_by("?") with RandomBookSampler on a temporary catalog that is rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'books':>8} {'order_by ms':>12} {'sampler ms':>11} {'queries':>8}")
+        for books in options['books']:
+            with transaction.atomic():
+                self.fill(books)
+                exclude = Book.objects.values_list('book_id', flat=True).first()
+                order_by = self.time(options['repeat'], lambda: list(
+                    Book.objects.filter(is_donated=False).exclude(book_id=exclude).order_by('?')[:5]
+                ))
+                sampler = RandomBookSampler()
+                sampler.refresh()
+                sample = self.time(options['repeat'], lambda: list(sampler.sample(5, exclude=[exclude])))
+                with CaptureQueriesContext(connection) as queries:
+                    list(sampler.sample(5, exclude=[exclude]))
+                self.stdout.write(f'{books:>8} {order_by * 1000:>12.2f} {sample * 1000:>11.2f} {len(queries):>8}')
+                transaction.set_rollback(True)
+
+    def fill(self, books):
+        donator = get_user_model().objects.create_user(
+            email='benchmark@example.com', password='benchmark', name='benchmark', phone_number='0'
+        )
+        Book.objects.bulk_create(
+            (Book(name=f'book {i}', description=f'book {i}', donator=donator, is_donated=i % 10 == 0) for i in range(books)),
+            batch_size=5000,
+        )
+
+    def time(self, repeat, function):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - started) / repeat
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from Book.utils.keyword_job_util import KeywordJobUtil
+
+
+class Command(BaseCommand):
+    help = 'Extracts the keywords of newly registered books through the flask server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit when no job is due instead of polling')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--poll-interval', type=float, default=None)
+
+    def handle(self, *args, **options):
+        KeywordJobUtil(options['batch_size']).run(once=options['once'], poll_interval=options['poll_interval'])
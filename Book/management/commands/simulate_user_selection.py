@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from Book.models import BookRequest
+from Book.user_selection_strategy.registry import get_strategy, strategies
+from Book.user_selection_strategy.simulation import simulate, synthetic_history
+from MyUser.models import MyUser
+
+
+class Command(BaseCommand):
+    help = 'Replays donations through the registered user selection strategies and reports fairness and cost per selection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategy', nargs='+', default=None, help='registered strategy names, all of them by default')
+        parser.add_argument('--trials', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--from-db', action='store_true', help='replay the requests of the donated books instead of a synthetic history')
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--donations', type=int, default=5000)
+        parser.add_argument('--requesters', type=int, default=20, help='average number of requesters of a synthetic donation')
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            credits, vip, history = self.recorded_history()
+        else:
+            credits, vip, history = synthetic_history(options['users'], options['donations'], options['requesters'], options['seed'])
+        self.stdout.write(f'{len(credits)} users, {len(history)} donations, {options["trials"]} trials')
+        self.stdout.write(f"{'strategy':>10} {'selections':>11} {'us/selection':>13} {'gini':>6} {'vip advantage':>14}")
+        for name in options['strategy'] or strategies:
+            result = simulate(get_strategy(name), credits, vip, history, options['trials'], options['seed'])
+            self.stdout.write(f"{name:>10} {result['selections']:>11} {result['per_selection_us']:>13.4f} "
+                              f"{result['gini']:>6.3f} {result['vip_advantage']:>14.3f}")
+
+    def recorded_history(self):
+        # the requesters of every donated book, with the credits and VIP state the users have now
+        users = MyUser.objects.with_effective_vip().values_list('user_id', 'credit', 'effective_vip')
+        index, credits, vip = {}, [], []
+        for user_id, credit, effective_vip in users.iterator():
+            index[user_id] = len(credits)
+            credits.append(credit)
+            vip.append(effective_vip)
+        requesters = defaultdict(list)
+        for book_id, user_id in BookRequest.objects.filter(book__is_donated=True).values_list('book_id', 'user_id').iterator():
+            requesters[book_id].append(index[user_id])
+        return np.array(credits), np.array(vip, dtype=bool), [np.array(indices) for indices in requesters.values()]
@@ -1,4 +1,14 @@
 from django.db import models
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+
+class BookQuerySet(models.QuerySet):
+    def with_is_requested_before(self, user):
+        # whether user has requested each book, as one subquery instead of a query per book
+        return self.annotate(
+            is_requested_before=Exists(BookRequest.objects.filter(book=OuterRef('pk'), user=user))
+        )
 
 
 class Book(models.Model):
@@ -19,6 +29,14 @@ class Book(models.Model):
     number_of_request = models.IntegerField(default=0)
     keywords = models.CharField(max_length=500, null=True, blank=True)
 
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the keyset of AllBooks pages
+            models.Index(fields=['created_at', 'book_id']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -38,3 +56,33 @@ class BookRequest(models.Model):
     status = models.CharField(max_length=10, default=PENDING)
     is_reported = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the keyset of My_requests pages
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
+
+
+class KeywordJob(models.Model):
+    PENDING = 'Pending'
+    RUNNING = 'Running'
+    DONE = 'Done'
+    FAILED = 'Failed'
+
+    book = models.OneToOneField('Book.Book', on_delete=models.CASCADE, related_name='keyword_job')
+    status = models.CharField(max_length=10, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # a pending job waits for it, a running one is taken over by another worker after it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} {self.status}'
@@ -29,7 +29,11 @@ class AllBooksSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         assert isinstance(instance, Book)
         result = super().to_representation(instance)
-        result['is_requested_before'] = BookRequest.objects.filter(book=instance, user=self.context['request'].user).exists()
+        if hasattr(instance, 'is_requested_before'):
+            # annotated by Book.objects.with_is_requested_before()
+            result['is_requested_before'] = instance.is_requested_before
+        else:
+            result['is_requested_before'] = BookRequest.objects.filter(book=instance, user=self.context['request'].user).exists()
         return result
 
 
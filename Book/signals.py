@@ -1,9 +1,13 @@
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.db.models.signals import post_save
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
-from Book.models import BookRequest, Book
-import requests
+from Book.models import BookRequest, Book, KeywordJob
+from Book.utils.recommender_client import recommender_client
+from Book.utils.random_book_sampler import random_books
+from Book.utils.book_search_index import book_search_index
 import logging
 from django.utils import timezone
 
@@ -13,69 +17,63 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=BookRequest)
 def book_request_created(sender, instance, created, **kwargs):
     if created:
-        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_created_signal: book = {instance.book} user = {instance.user}")
-        book = instance.book
-        book.number_of_request = book.number_of_request + 1
-        book.save()
-        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_create_signal: book = {book} number_of_request = {book.number_of_request}")
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_created_signal: book = {instance.book_id} user = {instance.user_id}")
+        # one UPDATE computed by the database, so concurrent requests do not overwrite each other's count
+        # and the Book post_save receivers are not run again for a counter
+        Book.objects.filter(book_id=instance.book_id).update(number_of_request=F('number_of_request') + 1)
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_create_signal: book = {instance.book_id} number_of_request incremented")
 
 
 @receiver(post_delete, sender=BookRequest)
 def book_request_deleted(sender, instance, **kwargs):
-    logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_deleted_signal: book = {instance.book} user = {instance.user}")
-    book = instance.book
-    book.number_of_request = max(book.number_of_request - 1, 0)
-    book.save()
-    logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_delete_signal: book = {book} number_of_request = {book.number_of_request}")
+    logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_deleted_signal: book = {instance.book_id} user = {instance.user_id}")
+    if isinstance(kwargs.get('origin'), Book):
+        # deleted along with its book, there is no counter left to keep
+        return
+    Book.objects.filter(book_id=instance.book_id, number_of_request__gt=0).update(number_of_request=F('number_of_request') - 1)
+    logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_request_delete_signal: book = {instance.book_id} number_of_request decremented")
 
 
 @receiver(post_save, sender=Book)
 def book_created(sender, instance, created, **kwargs):
     if created:
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}")
-        request = {
-            'id': instance.book_id,
-            'summary': str(instance.description),
-        }
-
         if settings.USE_FLASK_SERVER:
-            try:
-                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}, trying to send request to flask server")
-                response = requests.post(settings.FLASK_SERVER_ADDRESS + '/insert_book', data=request)
-                if response.status_code == 200:
-                    logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}, request was successful, book inserted to flask server")
-                    keywords = response.json()
-                    instance.keywords = keywords
-                else:
-                    if settings.DEBUG:
-                        print(f'Request failed with status {response.status_code}: {response.text}')
-                        instance.keywords = instance.description.split(' ')[:5]
-                    else:
-                        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}, request failed with status {response.status_code}: {response.text}")
-                        instance.keywords = []
-            except:
-                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}, request failed")
-                if settings.DEBUG:
-                    print(f'Request failed')
-                    instance.keywords = instance.description.split(' ')[:5]
-                else:
-                    instance.keywords = []
-        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}, keywords = {instance.keywords}")
-        instance.save()
+            # keywords are extracted by the run_keyword_jobs worker, so registering a book does not wait for the recommender
+            KeywordJob.objects.create(book=instance)
+            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_created_signal: book = {instance}, keyword job queued")
+
 
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    # keeps the random suggestions and the search index of this process in step with the table
+    book_search_index.add(instance)
+    if instance.is_donated:
+        random_books.discard(instance.book_id)
+    else:
+        random_books.add(instance.book_id)
 
 
 @receiver(post_delete, sender=Book)
 def book_deleted(sender, instance, **kwargs):
     logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_deleted_signal: book = {instance}")
+    # a delete that is rolled back keeps the book in the recommender, the search index and the random suggestions
+    # the delete clears the primary key of the instance, so the id is taken now
+    book_id = instance.book_id
+    transaction.on_commit(lambda: book_delete_committed(instance, book_id))
+
+
+def book_delete_committed(instance, book_id):
+    random_books.discard(book_id)
+    book_search_index.remove(book_id)
     request = {
-        'id': instance.book_id,
+        'id': book_id,
     }
 
     if settings.USE_FLASK_SERVER:
         try:
             logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_deleted_signal: book = {instance}, trying to send request to flask server")
-            response = requests.post(settings.FLASK_SERVER_ADDRESS + '/delete_book', data=request)
+            response = recommender_client.post('/delete_book', data=request)
             if response.status_code == 200:
                 logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"book_deleted_signal: book = {instance}, request was successful, book deleted from flask server")
             else:
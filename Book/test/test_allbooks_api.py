@@ -1,9 +1,14 @@
 from datetime import datetime
+from unittest.mock import patch
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from Book.models import Book, BookRequest
 from Book.serializers import AllBooksSerializer
+from Book.utils.book_search_index import BookSearchIndex, book_search_index
 from rest_framework.test import APIRequestFactory
 
 
@@ -43,6 +48,7 @@ class AllBooksTests(APITestCase):
 
         self.url = '/book/all/'
         self.client.force_authenticate(user=self.user)
+        book_search_index.refresh()
 
     def tearDown(self) -> None:
         Book.objects.all().delete()
@@ -64,11 +70,11 @@ class AllBooksTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
         serialized_books = AllBooksSerializer([self.book1, self.book2], many=True,
                                               context=self.get_serializer_context(self.user)).data
         # there is no need to check for order of books, so we sort them first
-        response_data = sorted(response.data, key=lambda x: x['book_id'])
+        response_data = sorted(response.data['results'], key=lambda x: x['book_id'])
         serialized_books = sorted(serialized_books, key=lambda x: x['book_id'])
         self.assertEqual(response_data, serialized_books)
 
@@ -81,10 +87,10 @@ class AllBooksTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
         serialized_books = AllBooksSerializer([self.book1], many=True,
                                               context=self.get_serializer_context(self.user)).data
-        self.assertEqual(response.data, serialized_books)
+        self.assertEqual(response.data['results'], serialized_books)
 
     def test_filter_books_by_donator_should_return_filtered_books(self):
         # Arrange
@@ -95,10 +101,10 @@ class AllBooksTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
         serialized_books = AllBooksSerializer([self.book1], many=True,
                                               context=self.get_serializer_context(self.user)).data
-        self.assertEqual(response.data, serialized_books)
+        self.assertEqual(response.data['results'], serialized_books)
 
     def test_search_books_by_name_should_return_matching_books(self):
         # Arrange
@@ -109,12 +115,12 @@ class AllBooksTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
         request = APIRequestFactory().get('/book/all/')
         request.user = self.user
         serialized_books = AllBooksSerializer([self.book1], many=True,
                                               context=self.get_serializer_context(self.user)).data
-        self.assertEqual(response.data, serialized_books)
+        self.assertEqual(response.data['results'], serialized_books)
 
     def test_not_matching_search_should_return_no_books(self):
         # Arrange
@@ -125,7 +131,7 @@ class AllBooksTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_no_authentication_should_return_401(self):
         # Arrange
@@ -136,3 +142,235 @@ class AllBooksTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_is_requested_before_should_be_true_only_for_requested_books(self):
+        # Arrange
+        BookRequest.objects.create(user=self.user, book=self.book2)
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        requested = {book['book_id']: book['is_requested_before'] for book in response.data['results']}
+        self.assertEqual(requested, {self.book1.pk: False, self.book2.pk: True})
+
+    def test_get_all_books_should_run_the_same_number_of_queries_for_more_books(self):
+        # Arrange
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        for i in range(5):
+            book = Book.objects.create(name=f'Book {i + 3}', description='Description', donator_id=self.second_user.pk)
+            BookRequest.objects.create(user=self.user, book=book)
+
+        # Act
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_following_next_links_should_return_every_book_once_newest_first(self):
+        # Arrange
+        for i in range(3):
+            Book.objects.create(name=f'Book {i + 3}', description='Description', donator_id=self.second_user.pk)
+        expected = list(Book.objects.order_by('-created_at', '-book_id').values_list('book_id', flat=True))
+
+        # Act
+        book_ids, url, params = [], self.url, {'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            book_ids += [book['book_id'] for book in response.data['results']]
+            url, params = response.data['next'], None
+
+        # Assert
+        self.assertEqual(book_ids, expected)
+
+    def test_previous_link_should_return_the_previous_page(self):
+        # Arrange
+        first_page = self.client.get(self.url, {'page_size': 1})
+        second_page = self.client.get(first_page.data['next'])
+
+        # Act
+        response = self.client.get(second_page.data['previous'])
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], first_page.data['results'])
+        self.assertIsNone(response.data['previous'])
+        self.assertIsNone(first_page.data['previous'])
+
+    def test_invalid_cursor_should_return_404(self):
+        # Act
+        response = self.client.get(self.url, {'cursor': 'not a cursor'})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MAX_PAGE_SIZE=1)
+    def test_page_size_should_be_capped(self):
+        # Act
+        response = self.client.get(self.url, {'page_size': 100})
+
+        # Assert
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_fulltext_search_should_rank_name_matches_first(self):
+        # Arrange
+        description_match = Book.objects.create(name='Other', description='کتاب تاریخ', donator_id=self.second_user.pk)
+        name_match = Book.objects.create(name='تاریخ ایران', description='Description', donator_id=self.second_user.pk)
+
+        # Act
+        response = self.client.get(self.url, {'search': 'تاریخ', 'search_mode': 'fulltext'})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['book_id'] for book in response.data['results']], [name_match.pk, description_match.pk])
+
+    def test_fulltext_search_should_match_normalized_persian_text(self):
+        # Arrange
+        book = Book.objects.create(name='كتاب', description='Description', donator_id=self.second_user.pk)
+
+        # Act
+        response = self.client.get(self.url, {'search': 'کتاب', 'search_mode': 'fulltext'})
+
+        # Assert
+        self.assertEqual([book['book_id'] for book in response.data['results']], [book.pk])
+
+    def test_fulltext_search_should_page_through_ranked_results(self):
+        # Arrange
+        for i in range(3):
+            Book.objects.create(name=f'Novel {i}', description='novel ' * i, donator_id=self.second_user.pk)
+        expected = [book['book_id'] for book in self.client.get(self.url, {'search': 'novel', 'search_mode': 'fulltext'}).data['results']]
+
+        # Act
+        book_ids, url, params = [], self.url, {'search': 'novel', 'search_mode': 'fulltext', 'page_size': 1}
+        while url:
+            response = self.client.get(url, params)
+            book_ids += [book['book_id'] for book in response.data['results']]
+            url, params = response.data['next'], None
+
+        # Assert
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(book_ids, expected)
+
+    def test_fulltext_search_should_page_past_books_dropped_by_other_filters(self):
+        # Arrange
+        undonated = []
+        for i in range(6):
+            book = Book.objects.create(name=f'Novel {i}', description='novel ' * i, is_donated=i % 3 != 0, donator_id=self.second_user.pk)
+            if not book.is_donated:
+                undonated.append(book.pk)
+
+        # Act
+        book_ids, url, params = [], self.url, {'search': 'novel', 'search_mode': 'fulltext', 'is_donated': False, 'page_size': 1}
+        while url:
+            response = self.client.get(url, params)
+            book_ids += [book['book_id'] for book in response.data['results']]
+            url, params = response.data['next'], None
+
+        # Assert
+        self.assertEqual(sorted(book_ids), sorted(undonated))
+        self.assertEqual(book_ids, [book_id for book_id, _ in book_search_index.search('novel') if book_id in undonated])
+
+    @patch.object(BookSearchIndex, 'refresh_in_background')
+    def test_fulltext_search_while_index_is_built_should_fall_back_to_like_search(self, mock_refresh):
+        # Arrange
+        with patch('Book.utils.book_search_index.book_search_index', BookSearchIndex()):
+
+            # Act
+            response = self.client.get(self.url, {'search': 'Book 2', 'search_mode': 'fulltext'})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_refresh.assert_called_once()
+        self.assertEqual([book['book_id'] for book in response.data['results']], [self.book2.pk])
+
+    def test_search_index_refresh_should_keep_a_book_removed_while_it_runs(self):
+        # Arrange
+        index = BookSearchIndex()
+        fingerprint = index.fingerprint
+        def remove_while_refreshing(book):
+            if index.changes is not None:
+                index.remove(self.book2.pk)
+            return fingerprint(book)
+
+        # Act
+        with patch.object(index, 'fingerprint', side_effect=remove_while_refreshing):
+            index.refresh()
+
+        # Assert
+        self.assertEqual([book_id for book_id, _ in index.search('Book')], [self.book1.pk])
+
+    def test_fulltext_search_should_not_return_deleted_book(self):
+        # Arrange
+        self.client.get(self.url, {'search': 'Book', 'search_mode': 'fulltext'})
+        self.book1.delete()
+
+        # Act
+        response = self.client.get(self.url, {'search': 'Book', 'search_mode': 'fulltext'})
+
+        # Assert
+        self.assertEqual([book['book_id'] for book in response.data['results']], [self.book2.pk])
+
+    def test_fulltext_search_without_search_term_should_return_all_books(self):
+        # Act
+        response = self.client.get(self.url, {'search_mode': 'fulltext'})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['book_id'] for book in response.data['results']], [self.book2.pk, self.book1.pk])
+
+    @override_settings(USE_FLASK_SERVER=True)
+    @patch('Book.utils.book_search_index.recommender_client.post')
+    def test_semantic_search_should_keep_the_order_of_flask_server(self, mock_post):
+        # Arrange
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = [self.book1.pk, self.book2.pk]
+
+        # Act
+        response = self.client.get(self.url, {'search': 'old stories', 'search_mode': 'semantic'})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args.kwargs['json']['query'], 'old stories')
+        self.assertEqual([book['book_id'] for book in response.data['results']], [self.book1.pk, self.book2.pk])
+
+    @override_settings(USE_FLASK_SERVER=True)
+    @patch('Book.utils.book_search_index.recommender_client.post', side_effect=Exception)
+    def test_semantic_search_when_flask_server_is_down_should_fall_back_to_fulltext(self, mock_post):
+        # Act
+        response = self.client.get(self.url, {'search': 'Book 2', 'search_mode': 'semantic'})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['book_id'] for book in response.data['results']], [self.book2.pk])
+
+    @override_settings(USE_FLASK_SERVER=True)
+    @patch('Book.views.recommender_client.post')
+    def test_with_suggestions_should_ask_flask_server_once_for_the_whole_page(self, mock_post):
+        # Arrange
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {str(self.book1.pk): [self.book2.pk], str(self.book2.pk): [self.book1.pk]}
+
+        # Act
+        response = self.client.get(self.url, {'with_suggestions': True})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_post.call_count, 1)
+        suggestions = {book['book_id']: book['suggestions'] for book in response.data['results']}
+        self.assertEqual(suggestions, {self.book1.pk: [self.book2.pk], self.book2.pk: [self.book1.pk]})
+
+    @override_settings(USE_FLASK_SERVER=True)
+    @patch('Book.views.recommender_client.post', side_effect=Exception)
+    def test_with_suggestions_when_flask_server_is_down_should_return_empty_suggestions(self, mock_post):
+        # Act
+        response = self.client.get(self.url, {'with_suggestions': True})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for book in response.data['results']:
+            self.assertEqual(book['suggestions'], [])
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
@@ -140,3 +142,44 @@ class BookInfoWithSuggestionTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_book_info_with_suggestion_should_not_return_book_donated_by_update(self):
+        # Arrange
+        Book.objects.filter(pk__in=[self.book2.pk, self.book3.pk]).update(is_donated=True)
+
+        # Act
+        response = self.make_request(self.book1.pk)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['book_id'] for book in response.data['similar_books']], [self.book4.pk])
+
+    def test_book_info_with_suggestion_should_return_new_book(self):
+        # Arrange
+        self.make_request(self.book1.pk)
+        Book.objects.filter(pk__in=[self.book2.pk, self.book3.pk, self.book4.pk]).delete()
+        book6 = Book.objects.create(name='Book 6', description='Description 6', donator_id=self.user.pk)
+
+        # Act
+        response = self.make_request(self.book1.pk)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['book_id'] for book in response.data['similar_books']], [book6.pk])
+
+    def test_book_info_with_suggestion_should_run_the_same_number_of_queries_for_requested_books(self):
+        # Arrange
+        self.make_request(self.book1.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.make_request(self.book1.pk)
+        for book in [self.book1, self.book2, self.book3, self.book4]:
+            BookRequest.objects.create(user=self.user, book=book)
+
+        # Act
+        with self.assertNumQueries(len(queries)):
+            response = self.make_request(self.book1.pk)
+
+        # Assert
+        self.assertTrue(response.data['book']['is_requested_before'])
+        for book in response.data['similar_books']:
+            self.assertTrue(book['is_requested_before'])
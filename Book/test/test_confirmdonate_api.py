@@ -1,3 +1,6 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
@@ -122,6 +125,94 @@ class TestConfirmDonate(APITestCase):
         self.assertEqual(book_request_results.count(BookRequest.REJECTED), len(book_request_results) - 1)
 
 
+    def test_confirm_donate_should_run_the_same_number_of_queries_for_more_requests(self):
+        # Arrange
+        self.client.force_authenticate(user=self.user)
+        BookRequest.objects.create(user_id=self.second_user.pk, book_id=self.book1.pk, status=BookRequest.PENDING)
+        third_user = get_user_model().objects.create_user(email='third_user@example.com', password='testpassword', name='Third User', phone_number='123456789')
+        BookRequest.objects.create(user_id=third_user.pk, book_id=self.book1.pk, status=BookRequest.PENDING)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'book': self.book1.pk}, format='json')
+        book = Book.objects.create(name='Book 4', description='Description 4', author='Author 4', donator_id=self.user.pk)
+        for i in range(20):
+            requester = get_user_model().objects.create_user(email=f'user{i}@example.com', password='testpassword', name=f'User {i}', phone_number='123456789')
+            BookRequest.objects.create(user=requester, book=book, status=BookRequest.PENDING)
+
+        # Act
+        with self.assertNumQueries(len(queries)):
+            response = self.client.post(self.url, {'book': book.pk}, format='json')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = list(BookRequest.objects.filter(book=book).values_list('status', flat=True))
+        self.assertEqual(statuses.count(BookRequest.APPROVED), 1)
+        self.assertEqual(statuses.count(BookRequest.REJECTED), 19)
+
+    def test_confirm_donate_with_named_strategy_by_admin_should_return_200(self):
+        # Arrange
+        book_request = BookRequest.objects.create(user_id=self.second_user.pk, book_id=self.book1.pk, status=BookRequest.PENDING)
+        self.user.is_admin = True
+        self.user.save()
+
+        # Act
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'book': self.book1.pk, 'strategy': 'random'}, format='json')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], self.second_user.name)
+        self.assertEqual(BookRequest.objects.get(pk=book_request.pk).status, BookRequest.APPROVED)
+
+    def test_confirm_donate_with_named_strategy_by_non_admin_should_return_403(self):
+        # Arrange
+        book_request = BookRequest.objects.create(user_id=self.second_user.pk, book_id=self.book1.pk, status=BookRequest.PENDING)
+
+        # Act
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'book': self.book1.pk, 'strategy': 'random'}, format='json')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Book.objects.get(pk=self.book1.pk).is_donated, False)
+        self.assertEqual(BookRequest.objects.get(pk=book_request.pk).status, BookRequest.PENDING)
+
+    def test_confirm_donate_with_unknown_strategy_should_return_400(self):
+        # Arrange
+        book_request = BookRequest.objects.create(user_id=self.second_user.pk, book_id=self.book1.pk, status=BookRequest.PENDING)
+        self.user.is_admin = True
+        self.user.save()
+
+        # Act
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'book': self.book1.pk, 'strategy': 'unknown'}, format='json')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'Invalid strategy'})
+        self.assertEqual(Book.objects.get(pk=self.book1.pk).is_donated, False)
+        self.assertEqual(BookRequest.objects.get(pk=book_request.pk).status, BookRequest.PENDING)
+
+    @override_settings(USER_SELECTION_SEED=7)
+    def test_confirm_donate_with_seed_should_repeat_the_draw_of_a_book(self):
+        # Arrange
+        users = [
+            get_user_model().objects.create_user(email=f'user{i}@example.com', password='testpassword', name=f'User {i}', phone_number='123456789')
+            for i in range(10)
+        ]
+        for user in users:
+            BookRequest.objects.create(user=user, book=self.book1, status=BookRequest.PENDING)
+        self.client.force_authenticate(user=self.user)
+
+        # Act
+        first = self.client.post(self.url, {'book': self.book1.pk}, format='json')
+        Book.objects.filter(pk=self.book1.pk).update(is_donated=False)
+        BookRequest.objects.filter(book=self.book1).update(status=BookRequest.PENDING)
+        second = self.client.post(self.url, {'book': self.book1.pk}, format='json')
+
+        # Assert
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+
     def test_not_authenticated_user_should_return_401(self):
         # Act
         response = self.client.post(self.url, {'book': self.book1.pk}, format='json')
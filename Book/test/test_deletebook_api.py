@@ -1,8 +1,13 @@
+from unittest.mock import patch
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from Book.models import Book, BookRequest
 from Book.serializers import AllBooksSerializer
+from Book.utils.random_book_sampler import random_books
 from rest_framework.test import APIRequestFactory
 
 
@@ -133,4 +138,75 @@ class DeleteBookTests(APITestCase):
         self.assertEqual(self.second_user.rooyesh, previous_rooyesh)
         self.assertEqual(Book.objects.count(), 2)
 
+    def test_delete_book_should_run_the_same_number_of_queries_for_more_requests(self):
+        # Arrange
+        third_user = get_user_model().objects.create_user(email='third_user@example.com', password='testpassword', name='Third User', phone_number='123456789')
+        BookRequest.objects.create(user_id=self.second_user.pk, book_id=self.book1.pk)
+        BookRequest.objects.create(user_id=third_user.pk, book_id=self.book1.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'book': self.book1.pk})
+        book = Book.objects.create(name='Book 3', description='Description 3', author='Author 3', donator_id=self.user.pk)
+        requesters = []
+        for i in range(20):
+            requester = get_user_model().objects.create_user(email=f'user{i}@example.com', password='testpassword', name=f'User {i}', phone_number='123456789')
+            BookRequest.objects.create(user=requester, book=book)
+            requesters.append(requester)
+        previous_rooyesh = [requester.rooyesh for requester in requesters]
+
+        # Act
+        with self.assertNumQueries(len(queries)):
+            response = self.client.post(self.url, {'book': book.pk})
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(BookRequest.objects.filter(book_id=book.pk).exists())
+        for requester in requesters:
+            requester.refresh_from_db()
+        self.assertEqual([requester.rooyesh for requester in requesters], [rooyesh + 1 for rooyesh in previous_rooyesh])
+
+    @override_settings(USE_FLASK_SERVER=True)
+    @patch('Book.signals.recommender_client.post')
+    def test_delete_book_should_tell_the_recommender_only_after_commit(self, mock_post):
+        # Arrange
+        data = {
+            'book': self.book1.pk
+        }
+
+        # Act
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(self.url, data)
+        called_before_commit = mock_post.called
+        for callback in callbacks:
+            callback()
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(called_before_commit)
+        mock_post.assert_called_once_with('/delete_book', data={'id': self.book1.pk})
+
+    def test_delete_book_when_rolled_back_should_keep_the_book_in_random_suggestions(self):
+        # Arrange
+        random_books.add(self.book1.pk)
+
+        # Act
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Book.objects.get(pk=self.book1.pk).delete()
+                transaction.set_rollback(True)
+
+        # Assert
+        self.assertIn(self.book1.pk, random_books.index)
+        self.assertTrue(Book.objects.filter(pk=self.book1.pk).exists())
+
+    def test_deleting_a_request_of_another_book_should_still_decrease_its_counter(self):
+        # Arrange
+        BookRequest.objects.create(user_id=self.user.pk, book_id=self.book2.pk)
+        BookRequest.objects.create(user_id=self.second_user.pk, book_id=self.book1.pk)
 
+        # Act
+        self.client.post(self.url, {'book': self.book1.pk})
+        BookRequest.objects.filter(book_id=self.book2.pk).delete()
+
+        # Assert
+        self.book2.refresh_from_db()
+        self.assertEqual(self.book2.number_of_request, 0)
@@ -134,4 +134,16 @@ class DeleteRequestTestCase(APITestCase):
         # Assert
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(BookRequest.objects.count(), 1)
-        self.assertEqual(self.user.rooyesh, 0)
\ No newline at end of file
+        self.assertEqual(self.user.rooyesh, 0)
+
+    def test_delete_request_should_decrease_number_of_request(self):
+        # Arrange
+        BookRequest.objects.create(user_id=self.user.pk, book_id=self.book1.pk, status=BookRequest.PENDING)
+        self.client.force_authenticate(user=self.user)
+
+        # Act
+        self.client.post(self.url, {'book': self.book1.book_id}, format='json')
+
+        # Assert
+        self.book1.refresh_from_db()
+        self.assertEqual(self.book1.number_of_request, 0)
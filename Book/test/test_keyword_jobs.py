@@ -0,0 +1,128 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth import get_user_model
+from Book.models import Book, KeywordJob
+from Book.utils.keyword_job_util import KeywordJobUtil
+
+
+@override_settings(USE_FLASK_SERVER=True, DEBUG=False, KEYWORD_JOB_MAX_ATTEMPTS=2)
+class KeywordJobTests(APITestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword',
+            name='John Doe',
+            phone_number='123456789'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self) -> None:
+        Book.objects.all().delete()
+        get_user_model().objects.all().delete()
+
+        return super().tearDown()
+
+    def create_book(self, name):
+        return Book.objects.create(name=name, description=f'{name} description', donator=self.user)
+
+    @patch('Book.utils.keyword_job_util.recommender_client.post')
+    def test_register_book_should_queue_a_job_without_calling_flask_server(self, mock_post):
+        # Act
+        response = self.client.post('/book/register/', {'name': 'Book 1', 'description': 'Book 1 description'}, format='json')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(mock_post.call_count, 0)
+        job = KeywordJob.objects.get()
+        self.assertEqual(job.book.name, 'Book 1')
+        self.assertEqual(job.status, KeywordJob.PENDING)
+
+    @patch('Book.utils.keyword_job_util.recommender_client.post')
+    def test_process_batch_should_send_one_request_and_write_keywords(self, mock_post):
+        # Arrange
+        book1, book2 = self.create_book('Book 1'), self.create_book('Book 2')
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {
+            'keywords': {str(book1.pk): ['first'], str(book2.pk): ['second']},
+            'errors': {},
+        }
+
+        # Act
+        taken = KeywordJobUtil().process_batch()
+
+        # Assert
+        self.assertEqual(taken, 2)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(Book.objects.get(pk=book1.pk).keywords, str(['first']))
+        self.assertEqual(Book.objects.get(pk=book2.pk).keywords, str(['second']))
+        self.assertEqual(KeywordJob.objects.filter(status=KeywordJob.DONE, attempts=1).count(), 2)
+
+    @patch('Book.utils.keyword_job_util.recommender_client.post', side_effect=Exception('connection refused'))
+    def test_process_batch_when_flask_server_is_down_should_retry_later(self, mock_post):
+        # Arrange
+        book = self.create_book('Book 1')
+
+        # Act
+        KeywordJobUtil().process_batch()
+
+        # Assert
+        job = KeywordJob.objects.get(book=book)
+        self.assertEqual(job.status, KeywordJob.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.next_attempt_at, timezone.now())
+        self.assertIn('connection refused', job.last_error)
+        self.assertEqual(KeywordJobUtil().process_batch(), 0)
+
+    @patch('Book.utils.keyword_job_util.recommender_client.post', side_effect=Exception('connection refused'))
+    def test_process_batch_after_max_attempts_should_fail_the_job(self, mock_post):
+        # Arrange
+        book = self.create_book('Book 1')
+        KeywordJob.objects.filter(book=book).update(attempts=1)
+
+        # Act
+        KeywordJobUtil().process_batch()
+
+        # Assert
+        job = KeywordJob.objects.get(book=book)
+        self.assertEqual(job.status, KeywordJob.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(Book.objects.get(pk=book.pk).keywords, str([]))
+
+    @patch('Book.utils.keyword_job_util.recommender_client.post')
+    def test_process_batch_when_extraction_fails_should_fail_only_that_job(self, mock_post):
+        # Arrange
+        book1, book2 = self.create_book('Book 1'), self.create_book('Book 2')
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {
+            'keywords': {str(book1.pk): ['first']},
+            'errors': {str(book2.pk): 'no keywords extracted'},
+        }
+
+        # Act
+        KeywordJobUtil().process_batch()
+
+        # Assert
+        self.assertEqual(KeywordJob.objects.get(book=book1).status, KeywordJob.DONE)
+        job = KeywordJob.objects.get(book=book2)
+        self.assertEqual(job.status, KeywordJob.FAILED)
+        self.assertEqual(job.last_error, 'no keywords extracted')
+
+    @patch('Book.utils.keyword_job_util.recommender_client.post')
+    def test_process_batch_should_take_over_jobs_of_a_stuck_worker(self, mock_post):
+        # Arrange
+        book = self.create_book('Book 1')
+        KeywordJob.objects.filter(book=book).update(status=KeywordJob.RUNNING, next_attempt_at=timezone.now() - timedelta(seconds=1))
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {'keywords': {str(book.pk): ['first']}, 'errors': {}}
+
+        # Act
+        call_command('run_keyword_jobs', '--once')
+
+        # Assert
+        self.assertEqual(KeywordJob.objects.get(book=book).status, KeywordJob.DONE)
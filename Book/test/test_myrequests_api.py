@@ -76,7 +76,7 @@ class MyRequestsTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
 
     def test_get_my_requests_should_return_only_my_requests(self):
@@ -99,8 +99,8 @@ class MyRequestsTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['user'], self.user.pk)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['user'], self.user.pk)
 
 
     def test_get_approved_request_should_return_donator_phone_number_as_well(self):
@@ -117,7 +117,7 @@ class MyRequestsTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]['phone_number'], self.book3.donator.phone_number)
+        self.assertEqual(response.data['results'][0]['phone_number'], self.book3.donator.phone_number)
 
 
     def test_get_my_requests_should_return_only_my_requests_with_status(self):
@@ -140,5 +140,5 @@ class MyRequestsTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['status'], 'PENDING')
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['status'], 'PENDING')
\ No newline at end of file
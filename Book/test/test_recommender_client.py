@@ -0,0 +1,127 @@
+from unittest.mock import patch
+from django.test import override_settings
+from requests.exceptions import ConnectionError
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth import get_user_model
+from Book.models import Book
+from Book.utils.recommender_client import recommender_client, RecommenderUnavailable
+
+
+@override_settings(RECOMMENDER_BREAKER_THRESHOLD=2, RECOMMENDER_BREAKER_COOLDOWN=60)
+class RecommenderClientTests(APITestCase):
+
+    def setUp(self):
+        recommender_client.reset()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpassword',
+            name='John Doe',
+            phone_number='123456789'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self) -> None:
+        recommender_client.reset()
+        Book.objects.all().delete()
+        get_user_model().objects.all().delete()
+
+        return super().tearDown()
+
+    @patch.object(recommender_client.session, 'post')
+    def test_post_should_use_the_pooled_session_with_a_timeout(self, mock_post):
+        # Arrange
+        mock_post.return_value.status_code = 200
+
+        # Act
+        recommender_client.post('/ask_book', data={'id': 1})
+
+        # Assert
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertIsNotNone(mock_post.call_args.kwargs['timeout'])
+
+    @patch.object(recommender_client.session, 'post', side_effect=ConnectionError)
+    def test_post_after_repeated_failures_should_fail_fast(self, mock_post):
+        # Arrange
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                recommender_client.post('/ask_book', data={'id': 1})
+
+        # Act
+        with self.assertRaises(RecommenderUnavailable):
+            recommender_client.post('/ask_book', data={'id': 1})
+
+        # Assert
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(recommender_client.stats()['circuit_breaker'], 'open')
+
+    @patch.object(recommender_client.session, 'post')
+    def test_post_after_a_success_should_reset_the_failures(self, mock_post):
+        # Arrange
+        mock_post.side_effect = ConnectionError
+        mock_post.return_value.status_code = 200
+        with self.assertRaises(ConnectionError):
+            recommender_client.post('/ask_book', data={'id': 1})
+        mock_post.side_effect = None
+
+        # Act
+        recommender_client.post('/ask_book', data={'id': 1})
+
+        # Assert
+        stats = recommender_client.stats()
+        self.assertEqual(stats['failures_in_a_row'], 0)
+        self.assertEqual(stats['latency']['/ask_book']['count'], 2)
+        self.assertEqual(stats['latency']['/ask_book']['failed'], 1)
+        self.assertEqual(sum(stats['latency']['/ask_book']['histogram'].values()), 2)
+
+    @patch.object(recommender_client.session, 'post')
+    def test_post_when_the_answer_is_an_error_about_the_request_should_not_open_the_breaker(self, mock_post):
+        # Arrange
+        mock_post.return_value.status_code = 404
+        recommender_client.post('/ask_book', data={'id': 1})
+        mock_post.return_value.status_code = 500
+
+        # Act
+        recommender_client.post('/ask_book', data={'id': 1})
+
+        # Assert
+        stats = recommender_client.stats()
+        self.assertEqual(stats['circuit_breaker'], 'closed')
+        self.assertEqual(stats['latency']['/ask_book']['failed'], 0)
+
+    @patch.object(recommender_client.session, 'post')
+    def test_post_when_the_recommender_answers_503_should_open_the_breaker(self, mock_post):
+        # Arrange
+        mock_post.return_value.status_code = 503
+        recommender_client.post('/ask_book', data={'id': 1})
+
+        # Act
+        recommender_client.post('/ask_book', data={'id': 1})
+
+        # Assert
+        self.assertEqual(recommender_client.stats()['circuit_breaker'], 'open')
+
+    @override_settings(USE_FLASK_SERVER=True)
+    @patch.object(recommender_client.session, 'post', side_effect=ConnectionError)
+    def test_book_info_with_suggestion_when_breaker_is_open_should_use_random_books(self, mock_post):
+        # Arrange
+        book = Book.objects.create(name='Book 1', description='Book 1 description', donator=self.user)
+        Book.objects.create(name='Book 2', description='Book 2 description', donator=self.user)
+        for _ in range(2):
+            self.client.get(f'/book/info-suggestion/{book.pk}/')
+        calls = mock_post.call_count
+
+        # Act
+        response = self.client.get(f'/book/info-suggestion/{book.pk}/')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_post.call_count, calls)
+        self.assertEqual(len(response.data['similar_books']), 1)
+
+    def test_recommender_stats_when_user_is_not_admin_should_return_403(self):
+        # Act
+        response = self.client.get('/book/recommender-stats/')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,3 +1,8 @@
+import threading
+import time
+from django.db import OperationalError, connection, transaction
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
@@ -130,4 +135,87 @@ class AddRequestTests(APITestCase):
 
         # Assert
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(BookRequest.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(BookRequest.objects.count(), 0)
+
+    def test_add_request_should_increase_number_of_request(self):
+        # Act
+        self.make_request({'book': self.book1.pk})
+
+        # Assert
+        self.book1.refresh_from_db()
+        self.assertEqual(self.book1.number_of_request, 1)
+
+    def test_requests_created_from_stale_books_should_not_lose_increments(self):
+        # Arrange
+        users = [
+            get_user_model().objects.create_user(email=f'user{i}@example.com', password='testpassword', name=f'User {i}', phone_number='123456789')
+            for i in range(5)
+        ]
+        # every request holds a copy of the book read before any of them was counted, like concurrent requests do
+        stale_books = [Book.objects.get(pk=self.book1.pk) for _ in users]
+
+        # Act
+        for user, book in zip(users, stale_books):
+            BookRequest.objects.create(user=user, book=book)
+
+        # Assert
+        self.book1.refresh_from_db()
+        self.assertEqual(self.book1.number_of_request, 5)
+
+    def test_add_request_should_not_save_the_book(self):
+        # Arrange
+        saved = []
+        receiver = lambda sender, instance, **kwargs: saved.append(instance)
+        post_save.connect(receiver, sender=Book)
+
+        # Act
+        try:
+            self.make_request({'book': self.book1.pk})
+        finally:
+            post_save.disconnect(receiver, sender=Book)
+
+        # Assert
+        self.assertEqual(saved, [])
+
+
+class ConcurrentRequestsTests(TransactionTestCase):
+
+    def test_concurrent_requests_should_not_lose_increments(self):
+        # Arrange
+        donator = get_user_model().objects.create_user(email='donator@example.com', password='testpassword', name='Donator', phone_number='123456789')
+        book = Book.objects.create(name='Book 1', description='Description 1', author='Author 1', donator=donator)
+        users = [
+            get_user_model().objects.create_user(email=f'user{i}@example.com', password='testpassword', name=f'User {i}', phone_number='123456789')
+            for i in range(20)
+        ]
+        start = threading.Barrier(len(users))
+        errors = []
+
+        def request(user):
+            try:
+                stale_book = Book.objects.get(pk=book.pk)
+                start.wait()
+                # the sqlite test database locks the table for concurrent writers, a locked write is tried again
+                for _ in range(200):
+                    try:
+                        with transaction.atomic():
+                            BookRequest.objects.create(user=user, book=stale_book)
+                        break
+                    except OperationalError:
+                        time.sleep(0.01)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        # Act
+        threads = [threading.Thread(target=request, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        self.assertEqual(errors, [])
+        book.refresh_from_db()
+        self.assertEqual(book.number_of_request, len(users))
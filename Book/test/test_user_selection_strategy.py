@@ -0,0 +1,129 @@
+import random
+import numpy as np
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from Book.user_selection_strategy.random_user_selection import RandomUserSelectionStrategy
+from Book.user_selection_strategy.weighted_random_user_selection import WeightedRandomUserSelectionStrategy
+from Book.user_selection_strategy.registry import get_strategy
+from Book.user_selection_strategy.simulation import simulate
+
+
+class WeightedRandomUserSelectionTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.users = []
+        for i in range(30):
+            user = get_user_model().objects.create_user(
+                email=f'user{i}@example.com',
+                password='testpassword',
+                name=f'User {i}',
+                phone_number='123456789',
+                credit=i % 7 + 1,
+            )
+            if i % 3 == 1:
+                user.is_vip, user.vip_end_date = True, now + timedelta(days=1)
+            elif i % 3 == 2:
+                user.is_vip, user.vip_end_date = True, now - timedelta(days=1)
+            user.save()
+            self.users.append(user)
+        self.strategy = WeightedRandomUserSelectionStrategy()
+
+    @staticmethod
+    def legacy_select_user(registered_users):
+        weights = []
+        for user in registered_users:
+            if user.vip_end_date is not None and user.is_vip and user.vip_end_date >= timezone.now():
+                weights.append(user.credit * 1.1)
+            else:
+                weights.append(user.credit)
+        return random.choices(registered_users, weights=weights, k=1)[0]
+
+    def test_select_user_should_pick_the_same_user_as_random_choices_from_the_same_state(self):
+        # Arrange
+        users = get_user_model().objects.filter(pk__in=[user.pk for user in self.users])
+        ordered = list(users.order_by('pk'))
+
+        for seed in range(200):
+            # Act
+            random.seed(seed)
+            chosen = self.strategy.select_user(users)
+            random.seed(seed)
+            expected = self.legacy_select_user(ordered)
+
+            # Assert
+            self.assertEqual(chosen.pk, expected.pk)
+
+    def test_select_user_should_run_one_query_and_not_save_expired_vips(self):
+        # Arrange
+        users = get_user_model().objects.filter(pk__in=[user.pk for user in self.users])
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            self.strategy.select_user(users)
+
+        # Assert
+        self.assertEqual(len(queries), 1)
+
+    def test_select_user_on_no_users_should_return_none(self):
+        # Act & Assert
+        self.assertIsNone(self.strategy.select_user(get_user_model().objects.none()))
+        self.assertIsNone(RandomUserSelectionStrategy().select_user(get_user_model().objects.none()))
+
+    def test_strategies_with_the_same_seed_should_draw_the_same_users(self):
+        # Arrange
+        users = get_user_model().objects.filter(pk__in=[user.pk for user in self.users])
+
+        for name in ['random', 'weighted']:
+            # Act
+            first = [get_strategy(name, seed='book:1').select_user(users).pk for _ in range(5)]
+            second = [get_strategy(name, seed='book:1').select_user(users).pk for _ in range(5)]
+            strategy = get_strategy(name, seed='book:1')
+            stream = [strategy.select_user(users).pk for _ in range(5)]
+
+            # Assert
+            self.assertEqual(first, second)
+            self.assertEqual(stream[0], first[0])
+
+    def test_get_strategy_with_unknown_name_should_raise_value_error(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            get_strategy('unknown')
+
+
+class SimulationTests(TestCase):
+
+    def test_simulate_should_give_every_requester_its_share_of_the_weights(self):
+        # Arrange
+        strategy = WeightedRandomUserSelectionStrategy()
+        credits, vip = [1, 2, 3, 4], [False, False, True, False]
+        history = [np.array([0, 1, 2, 3]), np.array([1, 2]), np.array([3])]
+        trials = 100000
+
+        # Act
+        result = simulate(strategy, credits, vip, history, trials, seed=0, max_cells=1000)
+
+        # Assert
+        weights = strategy.weights(credits, vip)
+        expected = np.zeros(4)
+        for requesters in history:
+            expected[requesters] += weights[requesters] / weights[requesters].sum()
+        np.testing.assert_allclose(result['wins'] / trials, expected, atol=0.01)
+        self.assertEqual(result['selections'], len(history) * trials)
+        self.assertEqual(result['wins'].sum(), len(history) * trials)
+        self.assertEqual(list(result['requests']), [1, 2, 2, 2])
+
+    def test_simulate_with_the_same_seed_should_repeat_the_result(self):
+        # Arrange
+        history = [np.array([0, 1, 2]), np.array([2, 3])]
+
+        # Act
+        first = simulate(get_strategy('random'), [1, 1, 1, 1], [False] * 4, history, 1000, seed=3)
+        second = simulate(get_strategy('random'), [1, 1, 1, 1], [False] * 4, history, 1000, seed=3)
+
+        # Assert
+        self.assertEqual(list(first['wins']), list(second['wins']))
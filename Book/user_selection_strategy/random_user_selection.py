@@ -1,8 +1,14 @@
-import random
+import numpy as np
 
 from Book.user_selection_strategy.user_selection import UserSelectionStrategy
 
 
 class RandomUserSelectionStrategy(UserSelectionStrategy):
     def select_user(self, registered_users):
-        return random.choice(registered_users)
+        registered_users = list(registered_users)
+        if not registered_users:
+            return None
+        return self.rng.choice(registered_users)
+
+    def weights(self, credits, vip):
+        return np.ones(len(credits))
@@ -0,0 +1,26 @@
+import random
+
+from Book.user_selection_strategy.random_user_selection import RandomUserSelectionStrategy
+from Book.user_selection_strategy.weighted_random_user_selection import WeightedRandomUserSelectionStrategy
+
+# name -> strategy class; a registered strategy can be named by ConfirmDonate requests,
+# settings.USER_SELECTION_STRATEGY and the simulate_user_selection command
+strategies = {}
+
+
+def register(name, strategy_class):
+    strategies[name] = strategy_class
+    return strategy_class
+
+
+def get_strategy(name, seed=None):
+    # a seeded strategy draws from its own random stream, so the same seed repeats the same draws
+    try:
+        strategy_class = strategies[name]
+    except KeyError:
+        raise ValueError(f'unknown user selection strategy {name!r}')
+    return strategy_class(rng=None if seed is None else random.Random(seed))
+
+
+register('random', RandomUserSelectionStrategy)
+register('weighted', WeightedRandomUserSelectionStrategy)
@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+
+
+def simulate(strategy, credits, vip, history, trials, seed=None, max_cells=2 ** 22):
+    # Replays every donation of history (arrays of requester indices into credits and vip)
+    # trials times through strategy.weights. All draws of a chunk of donations are one
+    # searchsorted: every donation's cumulative weights are scaled to [0, 1] and shifted by
+    # its row, so a uniform draw shifted the same way can only land on that donation's requesters.
+    rng = np.random.default_rng(seed)
+    weights = np.asarray(strategy.weights(np.asarray(credits, dtype=float), np.asarray(vip, dtype=bool)), dtype=float)
+    history = [np.asarray(requesters) for requesters in history if len(requesters)]
+    wins = np.zeros(len(weights), dtype=np.int64)
+    requests = np.zeros(len(weights), dtype=np.int64)
+    for requesters in history:
+        requests[requesters] += 1
+
+    started = time.perf_counter()
+    start = 0
+    while start < len(history):
+        # as many donations as keep the padded requesters and the draws under max_cells
+        width, stop = len(history[start]), start + 1
+        while stop < len(history):
+            next_width = max(width, len(history[stop]))
+            if (stop + 1 - start) * max(next_width, trials) > max_cells:
+                break
+            width, stop = next_width, stop + 1
+        wins += draw(weights, history[start:stop], width, trials, rng, len(wins))
+        start = stop
+    seconds = time.perf_counter() - started
+
+    selections = len(history) * trials
+    return {
+        'selections': selections,
+        'per_selection_us': seconds / selections * 1e6 if selections else 0.0,
+        'wins': wins,
+        'requests': requests,
+        'gini': gini(wins[requests > 0] / (requests[requests > 0] * trials)),
+        'vip_advantage': vip_advantage(wins, requests, np.asarray(vip, dtype=bool)),
+    }
+
+
+def draw(weights, chunk, width, trials, rng, n_users):
+    # wins per user of trials draws from every donation of chunk
+    counts = np.array([len(requesters) for requesters in chunk])
+    requesters = np.zeros((len(chunk), width), dtype=np.int64)
+    real = np.arange(width) < counts[:, None]
+    requesters[real] = np.concatenate(chunk)
+    cum_weights = np.cumsum(np.where(real, weights[requesters], 0.0), axis=1)
+    total = cum_weights[:, -1:]
+    if not np.all(total > 0) or not np.all(np.isfinite(total)):
+        raise ValueError('Total of weights must be greater than zero and finite')
+    rows = np.arange(len(chunk))
+    shifted = (cum_weights / total + rows[:, None]).ravel()
+    draws = rng.random((trials, len(chunk))) + rows
+    positions = np.searchsorted(shifted, draws.ravel(), side='right')
+    row_of = np.tile(rows, trials)
+    # a draw rounded up to the end of its row stays on the row's last requester
+    columns = np.clip(positions - row_of * width, 0, counts[row_of] - 1)
+    return np.bincount(requesters[row_of, columns], minlength=n_users)
+
+
+def gini(values):
+    # 0 when every user has the same value, close to 1 when one user has all of it
+    values = np.sort(np.asarray(values, dtype=float))
+    if not len(values) or not values.sum():
+        return 0.0
+    ranks = np.arange(1, len(values) + 1)
+    return float(((2 * ranks - len(values) - 1) * values).sum() / (len(values) * values.sum()))
+
+
+def vip_advantage(wins, requests, vip):
+    # wins per request of the VIPs over wins per request of everyone else
+    vip_requests, other_requests = requests[vip].sum(), requests[~vip].sum()
+    if not vip_requests or not other_requests or not wins[~vip].sum():
+        return float('nan')
+    return float((wins[vip].sum() / vip_requests) / (wins[~vip].sum() / other_requests))
+
+
+def synthetic_history(users, donations, requesters, seed=None):
+    # credits, VIP flags and requester sets shaped roughly like the live tables
+    rng = np.random.default_rng(seed)
+    credits = rng.geometric(0.3, users)
+    vip = rng.random(users) < 0.1
+    sizes = np.minimum(rng.poisson(requesters, donations) + 1, users)
+    history = [rng.choice(users, size=size, replace=False) for size in sizes]
+    return credits, vip, history
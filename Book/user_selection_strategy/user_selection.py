@@ -1,8 +1,19 @@
+import random
 from abc import ABC, abstractmethod
 
 
 class UserSelectionStrategy(ABC):
+    def __init__(self, rng=None):
+        # draws come from the module level random unless a (seeded) random.Random is given
+        self.rng = random if rng is None else rng
+
     @abstractmethod
     def select_user(self, registered_users):
+        # registered_users is a MyUser queryset, returns one of them or None when it is empty
         pass
 
+    @abstractmethod
+    def weights(self, credits, vip):
+        # the chance of every user as NumPy arrays of credits and VIP flags, which is how
+        # Book.user_selection_strategy.simulation replays donations without the database
+        pass
@@ -1,17 +1,29 @@
-import random
+import numpy as np
 
 from Book.user_selection_strategy.user_selection import UserSelectionStrategy
 
 
 class WeightedRandomUserSelectionStrategy(UserSelectionStrategy):
+    VIP_WEIGHT = 1.1  # VIP members have 10% higher weight
+
     def select_user(self, registered_users):
+        # One query for the users with their VIP state, then one draw over the cumulative weights.
+        # The draw is random.choices(users, weights) step for step: the same sums, one random()
+        # and a right bisect, so it picks the same user from the same random state.
+        users = list(registered_users.with_effective_vip().order_by('pk'))
+        if not users:
+            return None
         # Assign weights based on user's credit and VIP status
-        weights = []
-        for user in registered_users:
-            if user.is_user_vip():
-                weight = user.credit * 1.1  # VIP members have 10% higher weight
-            else:
-                weight = user.credit
-            weights.append(weight)
+        credits = np.array([user.credit for user in users], dtype=float)
+        vip = np.array([user.effective_vip for user in users], dtype=bool)
+        cum_weights = np.cumsum(self.weights(credits, vip))
+        total = cum_weights[-1]
+        if not total > 0 or not np.isfinite(total):
+            raise ValueError('Total of weights must be greater than zero and finite')
         # Select a user based on weights
-        return random.choices(registered_users, weights=weights, k=1)[0]
+        index = np.searchsorted(cum_weights, self.rng.random() * total, side='right')
+        return users[min(index, len(users) - 1)]
+
+    def weights(self, credits, vip):
+        credits = np.asarray(credits, dtype=float)
+        return np.where(vip, credits * self.VIP_WEIGHT, credits)
@@ -0,0 +1,209 @@
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from hazm import Normalizer, word_tokenize
+from rest_framework.filters import SearchFilter
+
+from Book.models import Book
+from Book.utils.recommender_client import recommender_client
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BookSearchIndex:
+    # An in-process inverted index over name, author and description, ranked with BM25.
+    # Text goes through the same hazm Normalizer as keyword extraction in the recommender,
+    # so different spellings of one Persian word meet on the same token. The Book signals
+    # keep it current in this process, and it is reloaded every SEARCH_INDEX_TTL seconds for
+    # the changes made by other processes; a reload only tokenizes the books whose text changed.
+    # Builds run in a background thread, search answers None until the first one is done.
+    FIELD_WEIGHTS = {'name': 3, 'author': 2, 'description': 1}
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.normalizer = Normalizer()
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.lengths = {}
+        self.documents = {}
+        self.fingerprints = {}
+        self.total_length = 0
+        self.refreshed_at = None
+        self.refresh_thread = None
+        # books added or removed while a build runs, replayed on the finished build
+        self.changes = None
+
+    def tokens(self, text):
+        return [token.lower() for token in word_tokenize(self.normalizer.normalize(text or ''))
+                if any(char.isalnum() for char in token)]
+
+    def terms(self, book):
+        # weighted term frequencies of a book or of a values() row
+        get = book.get if isinstance(book, dict) else lambda field: getattr(book, field)
+        terms = Counter()
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for token in self.tokens(get(field)):
+                terms[token] += weight
+        return terms
+
+    def fingerprint(self, book):
+        get = book.get if isinstance(book, dict) else lambda field: getattr(book, field)
+        return hash(tuple(get(field) for field in self.FIELD_WEIGHTS))
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refresh_thread is not None and self.refresh_thread.is_alive():
+                return
+            self.refresh_thread = threading.Thread(target=self._refresh_thread, daemon=True)
+            self.refresh_thread.start()
+
+    def _refresh_thread(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                        f"BookSearchIndex.refresh: build failed, error = {e}")
+        finally:
+            connection.close()
+
+    def refresh(self):
+        with self.lock:
+            self.changes = {}
+        books = Book.objects.values('book_id', *self.FIELD_WEIGHTS)
+        postings, lengths, documents, fingerprints = {}, {}, {}, {}
+        for book in books.iterator():
+            book_id, fingerprint, terms = book['book_id'], self.fingerprint(book), None
+            with self.lock:
+                if self.fingerprints.get(book_id) == fingerprint:
+                    terms = {token: self.postings[token][book_id] for token in self.documents[book_id]}
+            if terms is None:
+                terms = self.terms(book)
+            for token, frequency in terms.items():
+                postings.setdefault(token, {})[book_id] = frequency
+            lengths[book_id] = sum(terms.values())
+            documents[book_id] = tuple(terms)
+            fingerprints[book_id] = fingerprint
+        with self.lock:
+            self.postings, self.lengths, self.documents, self.fingerprints = postings, lengths, documents, fingerprints
+            self.total_length = sum(lengths.values())
+            changes, self.changes = self.changes, None
+            for book_id, change in changes.items():
+                self._remove(book_id)
+                if change is not None:
+                    self._insert(book_id, *change)
+            self.refreshed_at = time.monotonic()
+
+    def add(self, book):
+        # replaces what was indexed for the same book_id
+        terms, fingerprint = self.terms(book), self.fingerprint(book)
+        with self.lock:
+            self._remove(book.book_id)
+            self._insert(book.book_id, terms, fingerprint)
+            if self.changes is not None:
+                self.changes[book.book_id] = (terms, fingerprint)
+
+    def remove(self, book_id):
+        with self.lock:
+            self._remove(book_id)
+            if self.changes is not None:
+                self.changes[book_id] = None
+
+    def _insert(self, book_id, terms, fingerprint):
+        for token, frequency in terms.items():
+            self.postings.setdefault(token, {})[book_id] = frequency
+        self.lengths[book_id] = sum(terms.values())
+        self.documents[book_id] = tuple(terms)
+        self.fingerprints[book_id] = fingerprint
+        self.total_length += self.lengths[book_id]
+
+    def _remove(self, book_id):
+        length = self.lengths.pop(book_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        del self.fingerprints[book_id]
+        for token in self.documents.pop(book_id):
+            books = self.postings[token]
+            del books[book_id]
+            if not books:
+                del self.postings[token]
+
+    def search(self, query):
+        # (book_id, score) of every book that contains every query token, best first,
+        # or None while the index is built for the first time
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at > settings.SEARCH_INDEX_TTL:
+            self.refresh_in_background()
+        if self.refreshed_at is None:
+            return None
+        tokens = set(self.tokens(query))
+        if not tokens:
+            return []
+        with self.lock:
+            postings = [self.postings.get(token, {}) for token in tokens]
+            postings.sort(key=len)
+            matches = set(postings[0]).intersection(*postings[1:])
+            n_books = len(self.lengths)
+            average_length = self.total_length / n_books if n_books else 0
+            scores = {}
+            for books in postings:
+                idf = math.log(1 + (n_books - len(books) + 0.5) / (len(books) + 0.5))
+                for book_id in matches:
+                    frequency = books[book_id]
+                    norm = self.K1 * (1 - self.B + self.B * self.lengths[book_id] / average_length)
+                    scores[book_id] = scores.get(book_id, 0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+        # equal scores keep the newest book first, like the default order of AllBooks
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+book_search_index = BookSearchIndex()
+
+
+class BookSearchFilter(SearchFilter):
+    # ?search_mode=fulltext ranks the matches of the index instead of filtering with LIKE scans,
+    # ?search_mode=semantic ranks every book by how close the recommender finds its keywords to
+    # the query and falls back to the full-text ranking when the recommender can not answer.
+    # The ranking is left on the request for BookPagination, which pages through it; until the
+    # index is built the full-text ranking falls back to the LIKE scans of SearchFilter
+    search_mode_param = 'search_mode'
+
+    def filter_queryset(self, request, queryset, view):
+        mode = request.query_params.get(self.search_mode_param)
+        if mode not in ('fulltext', 'semantic'):
+            return super().filter_queryset(request, queryset, view)
+        query = request.query_params.get(self.search_param, '')
+        if not book_search_index.tokens(query):
+            # nothing to rank by, every book is listed like SearchFilter does without a search term
+            return queryset
+        ranked = self.semantic_search(query) if mode == 'semantic' else None
+        if ranked is None:
+            ranked = book_search_index.search(query)
+        if ranked is None:
+            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                        "BookSearchFilter.filter_queryset: search index is being built, falling back to LIKE search")
+            return super().filter_queryset(request, queryset, view)
+        if not ranked:
+            return queryset.none()
+        request.search_ranking = ranked
+        return queryset
+
+    @staticmethod
+    def semantic_search(query):
+        # (book_id, score) of every book best first, the score only keeps the order of the recommender
+        if not settings.USE_FLASK_SERVER or not query.strip():
+            return None
+        try:
+            response = recommender_client.post('/search', json={'query': query, 'topn': Book.objects.count()})
+            if response.status_code != 200:
+                raise Exception(f'request failed with status {response.status_code}: {response.text}')
+            book_ids = response.json()
+        except Exception as e:
+            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                        f"BookSearchFilter.semantic_search: request failed, falling back to fulltext, error = {e}")
+            return None
+        return [(book_id, float(-rank)) for rank, book_id in enumerate(book_ids)]
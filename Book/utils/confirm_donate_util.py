@@ -1,49 +1,72 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN
 
 from Book.user_selection_strategy.user_selection import UserSelectionStrategy
+from Book.user_selection_strategy.registry import get_strategy
 from Book.models import BookRequest
 from Book.models import Book
+from MyUser.models import MyUser
 from django.utils import timezone
 import logging
 logger = logging.getLogger(__name__)
 
 
 class ConfirmDonateUtil:
-    def __init__(self, strategy: UserSelectionStrategy):
+    def __init__(self, strategy: UserSelectionStrategy = None):
+        # without a fixed strategy every confirmation takes one from the registry
         self.user_selection_strategy = strategy
 
+    def get_strategy(self, request: Request, book: Book):
+        # the strategy named in the request (admins only), else the fixed one, else settings.USER_SELECTION_STRATEGY
+        # drawing from a stream of its own book when USER_SELECTION_SEED is set
+        name = request.data.get('strategy')
+        if name is None and self.user_selection_strategy is not None:
+            return self.user_selection_strategy
+        seed = None if settings.USER_SELECTION_SEED is None else f'{settings.USER_SELECTION_SEED}:{book.book_id}'
+        return get_strategy(name or settings.USER_SELECTION_STRATEGY, seed)
+
     def confirm_donate(self, request: Request):
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "ConfirmDonate.post")
-        try:
-            book = Book.objects.get(is_donated=False, donator=request.user, book_id=request.data['book'])
-        except:
-            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
-                        "ConfirmDonate.post: book not found, response = 400")
-            return Response({"Invalid request"}, status=HTTP_400_BAD_REQUEST)
+        # the book row stays locked until the requests are settled, so two confirmations can not pick two users
+        with transaction.atomic():
+            try:
+                book = Book.objects.select_for_update().get(is_donated=False, donator=request.user, book_id=request.data['book'])
+            except:
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                            "ConfirmDonate.post: book not found, response = 400")
+                return Response({"Invalid request"}, status=HTTP_400_BAD_REQUEST)
 
-        all_requests = BookRequest.objects.filter(book=book)
-        registered_users = [x.user for x in all_requests if x.status == BookRequest.PENDING]
-        if len(registered_users) == 0:
-            return Response({"No one signed up yet"}, status=HTTP_400_BAD_REQUEST)
+            # the weighting is what VIP members pay for, so only admins may pick another strategy
+            if 'strategy' in request.data and not request.user.is_staff:
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                            f"ConfirmDonate.post: user {request.user} is not allowed to choose the strategy, response = 403")
+                return Response({"Only admins can choose the strategy"}, status=HTTP_403_FORBIDDEN)
 
-        chosen_user = self.user_selection_strategy.select_user(registered_users)
+            try:
+                strategy = self.get_strategy(request, book)
+            except ValueError as e:
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                            f"ConfirmDonate.post: {e}, response = 400")
+                return Response({"Invalid strategy"}, status=HTTP_400_BAD_REQUEST)
 
-        # set request status
-        for req in all_requests:
-            if req.user == chosen_user:
-                req.status = BookRequest.APPROVED
-            else:
-                req.status = BookRequest.REJECTED
+            all_requests = BookRequest.objects.filter(book=book)
+            registered_users = MyUser.objects.filter(requests_per_user__book=book, requests_per_user__status=BookRequest.PENDING)
+            chosen_user = strategy.select_user(registered_users)
+            if chosen_user is None:
+                return Response({"No one signed up yet"}, status=HTTP_400_BAD_REQUEST)
 
-            req.save()
+            # set request status, one statement for the chosen user and one for everyone else
+            approved = all_requests.filter(user=chosen_user).update(status=BookRequest.APPROVED)
+            rejected = all_requests.exclude(user=chosen_user).update(status=BookRequest.REJECTED)
             logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
-                        f"ConfirmDonate.post: request with user {req.user} and book {req.book} set to {req.status}")
+                        f"ConfirmDonate.post: book {book}, {approved} request of user {chosen_user} set to {BookRequest.APPROVED}, {rejected} requests set to {BookRequest.REJECTED}")
 
-        # set book donated
-        book.is_donated = True
-        book.save()
+            # set book donated
+            book.is_donated = True
+            book.save()
 
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
                     f"ConfirmDonate.post: book {book} set to donated")
@@ -0,0 +1,161 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Pages ordered by a (timestamp or score, primary key) pair. A cursor is the pair of the
+    # last (or first) row of a page, so the next page is a range query on the index of the
+    # pair and a deep page costs the same as the first one, unlike OFFSET paging.
+    ordering = ('-created_at', '-pk')
+    time_fields = ('created_at',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.current_ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[0] == 'previous'
+
+        ordering = [self.invert(field) for field in self.current_ordering] if reverse else list(self.current_ordering)
+        rows = self.fetch(queryset, ordering, cursor)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # the page we came from is always there, the other side only when the query found more rows
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else cursor is not None
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        if not rows and cursor is not None:
+            # a page emptied by deletions still links back to where it was reached from
+            self.has_next, self.has_previous = reverse, not reverse
+            self.first = self.last = cursor
+        return rows
+
+    def fetch(self, queryset, ordering, cursor):
+        # the page_size + 1 rows past the cursor in the given ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(ordering, cursor[1], cursor[2]))
+        return list(queryset[:self.page_size + 1])
+
+    def get_ordering(self, queryset):
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.PAGE_SIZE
+        return min(max(page_size, 1), settings.MAX_PAGE_SIZE)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def after(ordering, key, pk):
+        # rows past (key, pk) in the given ordering
+        key_field, pk_field = ordering
+        key_lookup = '__lt' if key_field.startswith('-') else '__gt'
+        pk_lookup = '__lt' if pk_field.startswith('-') else '__gt'
+        key_field, pk_field = key_field.lstrip('-'), pk_field.lstrip('-')
+        return Q(**{key_field + key_lookup: key}) | Q(**{key_field: key, pk_field + pk_lookup: pk})
+
+    def position(self, row):
+        if isinstance(row, tuple):
+            key, pk = row[1], row[2]
+        else:
+            key_field, pk_field = (field.lstrip('-') for field in self.current_ordering)
+            key, pk = getattr(row, key_field), getattr(row, pk_field)
+        return (key.isoformat() if isinstance(key, datetime) else key), pk
+
+    def encode_cursor(self, direction, row):
+        key, pk = self.position(row)
+        token = base64.urlsafe_b64encode(json.dumps([direction, key, pk]).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            direction, key, pk = json.loads(base64.urlsafe_b64decode(token.encode()))
+            # a timestamp travels as an ISO string, a score as a number
+            key = parse_datetime(key) if isinstance(key, str) else float(key)
+            if direction not in ('next', 'previous') or key is None or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if isinstance(key, datetime) != (self.current_ordering[0].lstrip('-') in self.time_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return direction, key, pk
+
+    def get_next_link(self):
+        return self.encode_cursor('next', self.last) if self.has_next else None
+
+    def get_previous_link(self):
+        return self.encode_cursor('previous', self.first) if self.has_previous else None
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class BookPagination(KeysetPagination):
+    # Search results come as a (book_id, score) ranking left on the request by BookSearchFilter.
+    # A page walks the ranking from the cursor and loads the next window of its ids, twice as many
+    # each time the other filters of the queryset drop some, so no page depends on how long it is.
+    ordering = ('-created_at', '-book_id')
+
+    def get_ordering(self, queryset):
+        if getattr(self.request, 'search_ranking', None) is not None:
+            return ('-search_score', '-book_id')
+        return self.ordering
+
+    def fetch(self, queryset, ordering, cursor):
+        ranking = getattr(self.request, 'search_ranking', None)
+        if ranking is None:
+            return super().fetch(queryset, ordering, cursor)
+        # the ranking is sorted by (-score, -book_id), a cursor is a position in that order
+        keys = [(-score, -book_id) for book_id, score in ranking]
+        reverse = not ordering[0].startswith('-')
+        if cursor is None:
+            ranked = ranking
+        elif reverse:
+            ranked = ranking[:bisect_left(keys, (-cursor[1], -cursor[2]))][::-1]
+        else:
+            ranked = ranking[bisect_right(keys, (-cursor[1], -cursor[2])):]
+
+        rows, start, window = [], 0, self.page_size + 1
+        while start < len(ranked) and len(rows) <= self.page_size:
+            scores = dict(ranked[start:start + window])
+            books = {book.book_id: book for book in queryset.filter(book_id__in=list(scores))}
+            for book_id, score in scores.items():
+                if book_id in books:
+                    books[book_id].search_score = score
+                    rows.append(books[book_id])
+            start, window = start + window, window * 2
+        return rows[:self.page_size + 1]
+
+
+class BookRequestPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,113 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from Book.models import Book, KeywordJob
+from Book.utils.recommender_client import recommender_client
+import logging
+logger = logging.getLogger(__name__)
+
+
+class KeywordJobUtil:
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.KEYWORD_JOB_BATCH_SIZE
+
+    def claim(self):
+        # jobs that are due, or whose worker did not finish them in KEYWORD_JOB_TIMEOUT seconds
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                KeywordJob.objects.select_for_update(skip_locked=True)
+                .select_related('book')
+                .filter(Q(status=KeywordJob.PENDING) | Q(status=KeywordJob.RUNNING), next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:self.batch_size]
+            )
+            KeywordJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=KeywordJob.RUNNING,
+                next_attempt_at=now + timedelta(seconds=settings.KEYWORD_JOB_TIMEOUT),
+                updated_at=now,
+            )
+        return jobs
+
+    def process_batch(self):
+        # returns the number of jobs that were taken
+        jobs = self.claim()
+        if not jobs:
+            return 0
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                    f"KeywordJobUtil.process_batch: {len(jobs)} books")
+        request = [{'id': job.book_id, 'summary': str(job.book.description)} for job in jobs]
+        try:
+            response = recommender_client.post('/insert_books', json=request,
+                                               timeout=(settings.RECOMMENDER_CONNECT_TIMEOUT, settings.KEYWORD_JOB_TIMEOUT))
+            if response.status_code != 200:
+                raise Exception(f'request failed with status {response.status_code}: {response.text}')
+            result = response.json()
+        except Exception as e:
+            self.retry(jobs, repr(e))
+            return len(jobs)
+
+        done = [job for job in jobs if str(job.book_id) in result['keywords']]
+        for job in done:
+            Book.objects.filter(book_id=job.book_id).update(keywords=result['keywords'][str(job.book_id)])
+        KeywordJob.objects.filter(pk__in=[job.pk for job in done]).update(
+            status=KeywordJob.DONE, attempts=F('attempts') + 1, last_error='', updated_at=timezone.now()
+        )
+
+        # the recommender could not extract keywords from these, which another attempt would not change
+        failed = [job for job in jobs if str(job.book_id) not in result['keywords']]
+        for job in failed:
+            self.fail(job, result['errors'].get(str(job.book_id), 'no keywords returned'))
+
+        self.forget_deleted([job.book_id for job in done])
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                    f"KeywordJobUtil.process_batch: {len(done)} done, {len(failed)} failed")
+        return len(jobs)
+
+    def retry(self, jobs, error):
+        now = timezone.now()
+        for job in jobs:
+            job.attempts += 1
+            if job.attempts >= settings.KEYWORD_JOB_MAX_ATTEMPTS:
+                self.fail(job, error)
+                continue
+            delay = min(settings.KEYWORD_JOB_RETRY_DELAY * 2 ** (job.attempts - 1), settings.KEYWORD_JOB_MAX_RETRY_DELAY)
+            KeywordJob.objects.filter(pk=job.pk).update(
+                status=KeywordJob.PENDING, attempts=job.attempts, last_error=error,
+                next_attempt_at=now + timedelta(seconds=delay), updated_at=now,
+            )
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                    f"KeywordJobUtil.retry: {len(jobs)} books, error = {error}")
+
+    def fail(self, job, error):
+        # the keywords a book got before when the flask server failed
+        keywords = job.book.description.split(' ')[:5] if settings.DEBUG else []
+        Book.objects.filter(book_id=job.book_id).update(keywords=keywords)
+        KeywordJob.objects.filter(pk=job.pk).update(
+            status=KeywordJob.FAILED, attempts=job.attempts, last_error=error, updated_at=timezone.now()
+        )
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                    f"KeywordJobUtil.fail: book = {job.book}, error = {error}")
+
+    def forget_deleted(self, book_ids):
+        # a book deleted while its job was running was inserted after book_deleted told the recommender
+        deleted = set(book_ids) - set(Book.objects.filter(book_id__in=book_ids).values_list('book_id', flat=True))
+        if deleted:
+            try:
+                recommender_client.post('/delete_books', json=sorted(deleted))
+            except Exception as e:
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                            f"KeywordJobUtil.forget_deleted: request failed, error = {e}")
+
+    def run(self, once=False, poll_interval=None):
+        poll_interval = settings.KEYWORD_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        while True:
+            taken = self.process_batch()
+            if once and not taken:
+                return
+            if not taken:
+                time.sleep(poll_interval)
@@ -0,0 +1,69 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from Book.models import Book
+
+
+class RandomBookSampler:
+    # Ids of the undonated books kept in memory, so picking random books does not sort the
+    # whole table like order_by('?'). The pool follows the Book signals of this process and is
+    # reloaded every RANDOM_BOOK_POOL_TTL seconds for the changes made by other processes;
+    # every sample is checked against the database, so a stale id is dropped, never returned.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = []
+        self.index = {}
+        self.refreshed_at = None
+
+    def refresh(self):
+        ids = list(Book.objects.filter(is_donated=False).values_list('book_id', flat=True))
+        with self.lock:
+            self.ids = ids
+            self.index = {book_id: position for position, book_id in enumerate(ids)}
+            self.refreshed_at = time.monotonic()
+
+    def add(self, book_id):
+        with self.lock:
+            if book_id not in self.index:
+                self.index[book_id] = len(self.ids)
+                self.ids.append(book_id)
+
+    def discard(self, book_id):
+        # the last id takes the place of the removed one
+        with self.lock:
+            position = self.index.pop(book_id, None)
+            if position is None:
+                return
+            last = self.ids.pop()
+            if last != book_id:
+                self.ids[position] = last
+                self.index[last] = position
+
+    def sample(self, n, exclude=()):
+        # a queryset of at most n random undonated books; the ids are checked with one query whatever the catalog size
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at > settings.RANDOM_BOOK_POOL_TTL:
+            self.refresh()
+        exclude = set(exclude)
+        chosen = []
+        for _ in range(3):
+            with self.lock:
+                # twice the missing books, so a few stale ids still leave enough
+                size = min(len(self.ids), 2 * (n - len(chosen)) + len(exclude) + len(chosen))
+                candidates = random.sample(self.ids, size)
+            candidates = [book_id for book_id in candidates if book_id not in exclude and book_id not in chosen]
+            if not candidates:
+                break
+            available = set(Book.objects.filter(book_id__in=candidates, is_donated=False).values_list('book_id', flat=True))
+            for book_id in set(candidates) - available:
+                self.discard(book_id)
+            chosen += [book_id for book_id in candidates if book_id in available][:n - len(chosen)]
+            if len(chosen) >= n:
+                break
+        return Book.objects.filter(book_id__in=chosen)
+
+
+random_books = RandomBookSampler()
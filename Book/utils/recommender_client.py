@@ -0,0 +1,96 @@
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils import timezone
+import logging
+logger = logging.getLogger(__name__)
+
+
+class RecommenderUnavailable(Exception):
+    pass
+
+
+class RecommenderClient:
+    # upper bounds of the latency histogram buckets in milliseconds, the last bucket is open
+    BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        # one keep-alive connection pool for every call of this process
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RECOMMENDER_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.latencies = {}
+
+    def available(self):
+        # after RECOMMENDER_BREAKER_THRESHOLD failures in a row calls fail fast for RECOMMENDER_BREAKER_COOLDOWN
+        # seconds, then calls go through again and the first failure opens the breaker once more
+        with self.lock:
+            return self.opened_at is None or time.monotonic() - self.opened_at >= settings.RECOMMENDER_BREAKER_COOLDOWN
+
+    def post(self, path, timeout=None, **kwargs):
+        if not self.available():
+            raise RecommenderUnavailable(f'{path}: circuit breaker is open')
+        if timeout is None:
+            timeout = (settings.RECOMMENDER_CONNECT_TIMEOUT, settings.RECOMMENDER_READ_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            response = self.session.post(settings.FLASK_SERVER_ADDRESS + path, timeout=timeout, **kwargs)
+        except Exception:
+            self.record(path, started, failed=True)
+            raise
+        # a 503 means the recommender cannot serve, any other status is an answer about this request
+        self.record(path, started, failed=response.status_code == 503)
+        return response
+
+    def record(self, path, started, failed):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            latency = self.latencies.setdefault(path, {
+                'count': 0, 'failed': 0, 'total_ms': 0.0, 'buckets': [0] * (len(self.BUCKETS) + 1),
+            })
+            latency['count'] += 1
+            latency['failed'] += failed
+            latency['total_ms'] += elapsed
+            latency['buckets'][bisect_left(self.BUCKETS, elapsed)] += 1
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= settings.RECOMMENDER_BREAKER_THRESHOLD:
+                self.opened_at = time.monotonic()
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                            f"RecommenderClient: {self.failures} failed calls in a row, circuit breaker is open")
+
+    def stats(self):
+        labels = [f'<={bound}ms' for bound in self.BUCKETS] + [f'>{self.BUCKETS[-1]}ms']
+        open_now = not self.available()
+        with self.lock:
+            return {
+                'circuit_breaker': 'open' if open_now else 'closed',
+                'failures_in_a_row': self.failures,
+                'latency': {
+                    path: {
+                        'count': latency['count'],
+                        'failed': latency['failed'],
+                        'average_ms': latency['total_ms'] / latency['count'],
+                        'histogram': dict(zip(labels, latency['buckets'])),
+                    }
+                    for path, latency in self.latencies.items()
+                },
+            }
+
+
+recommender_client = RecommenderClient()
@@ -1,15 +1,16 @@
 import random
-import requests
 from django.conf import Settings, settings
 
 from django.contrib.auth import get_user_model
-from rest_framework import filters, permissions
+from rest_framework import permissions
 from rest_framework.generics import CreateAPIView, RetrieveAPIView, ListAPIView, GenericAPIView, UpdateAPIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_200_OK
 from rest_framework.views import APIView
 from django.apps import apps
+from django.db import transaction
+from django.db.models import F
 from importlib import import_module
 
 
@@ -18,6 +19,10 @@ from Book.serializers import BookSerializer, BookRequestSerializer, MyRequestsSe
 from Book.user_selection_strategy.random_user_selection import RandomUserSelectionStrategy
 from Book.user_selection_strategy.weighted_random_user_selection import WeightedRandomUserSelectionStrategy
 from Book.utils.confirm_donate_util import ConfirmDonateUtil
+from Book.utils.recommender_client import recommender_client
+from Book.utils.random_book_sampler import random_books
+from Book.utils.keyset_pagination import BookPagination, BookRequestPagination
+from Book.utils.book_search_index import BookSearchFilter
 from MyUser.models import MyUser
 from django.utils import timezone
 import logging
@@ -41,7 +46,7 @@ class BookInfoWithSuggestion(APIView):
     def get(self, request, pk):
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "BookInfoWithSuggestion.get")
         try:
-            book = Book.objects.get(book_id=pk)
+            book = Book.objects.with_is_requested_before(request.user).get(book_id=pk)
         except:
             logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "BookInfoWithSuggestion.get: book not found, response = 400")
             return Response({"Invalid request"}, status=HTTP_400_BAD_REQUEST)
@@ -53,19 +58,20 @@ class BookInfoWithSuggestion(APIView):
         if settings.USE_FLASK_SERVER:
             logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "BookInfoWithSuggestion.get: using flask server")
             try:
-                res = requests.post(settings.FLASK_SERVER_ADDRESS + '/ask_book', data=req)
+                res = recommender_client.post('/ask_book', data=req)
                 if res.status_code == 200:
                     logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "BookInfoWithSuggestion.get: flask server respended with 200, using similar books provided by flask server")
                     similar_books = Book.objects.filter(book_id__in=res.json())
                 else:
                     logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "BookInfoWithSuggestion.get: flask server respended with 400, using random similar books")
-                    similar_books = Book.objects.filter(is_donated=False).exclude(book_id=book.book_id).order_by('?')[:5]
+                    similar_books = random_books.sample(5, exclude=[book.book_id])
             except:
                 logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "BookInfoWithSuggestion.get: flask server not found, using random similar books")
-                similar_books = Book.objects.filter(is_donated=False).exclude(book_id=book.book_id).order_by('?')[:5]
+                similar_books = random_books.sample(5, exclude=[book.book_id])
         else:
-            similar_books = Book.objects.filter(is_donated=False).exclude(book_id=book.book_id).order_by('?')[:5]
+            similar_books = random_books.sample(5, exclude=[book.book_id])
 
+        similar_books = similar_books.with_is_requested_before(request.user)
         response = {
             "book": AllBooksSerializer(book, context={'request': request}).data,
             "similar_books": AllBooksSerializer(similar_books, many=True, context={'request': request}).data,
@@ -79,13 +85,52 @@ class AllBooks(ListAPIView):
         permissions.IsAuthenticated
     ]
     serializer_class = AllBooksSerializer
+    pagination_class = BookPagination
 
-    filter_backends = (filters.SearchFilter, DjangoFilterBackend)
+    filter_backends = (BookSearchFilter, DjangoFilterBackend)
     filterset_fields = ['is_donated', 'donator']
     search_fields = ['name', 'description', 'author']
 
     queryset = Book.objects.all().order_by('-created_at')
 
+    def get_queryset(self):
+        return super().get_queryset().with_is_requested_before(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('with_suggestions'):
+            self.add_suggestions(response.data['results'])
+        return response
+
+    def add_suggestions(self, books):
+        # similar book ids for every book of the page from one ask_books call
+        suggestions = {}
+        if settings.USE_FLASK_SERVER:
+            req = {
+                'ids': [book['book_id'] for book in books],
+                'topn': 5,
+            }
+            try:
+                res = recommender_client.post('/ask_books', json=req)
+                if res.status_code == 200:
+                    suggestions = res.json()
+                else:
+                    logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"AllBooks.list: flask server respended with {res.status_code}, no suggestions")
+            except:
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "AllBooks.list: flask server not found, no suggestions")
+
+        for book in books:
+            book['suggestions'] = suggestions.get(str(book['book_id']), [])
+
+
+class RecommenderStats(APIView):
+    permission_classes = [
+        permissions.IsAdminUser
+    ]
+
+    def get(self, request):
+        return Response(recommender_client.stats(), status=HTTP_200_OK)
+
 
 class BookInfo(RetrieveAPIView):
     permission_classes = [
@@ -107,6 +152,7 @@ class My_requests(ListAPIView):
         permissions.IsAuthenticated
     ]
     serializer_class = MyRequestsSerializer
+    pagination_class = BookRequestPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ['status']
 
@@ -119,7 +165,7 @@ class ConfirmDonate(APIView):
         permissions.IsAuthenticated,
     ]
 
-    confirmation_util = ConfirmDonateUtil(settings.USER_SELECTION_STRATEGY)
+    confirmation_util = ConfirmDonateUtil()
 
     def post(self, request):
         return self.confirmation_util.confirm_donate(request)
@@ -132,30 +178,22 @@ class DeleteBook(APIView):
 
     def post(self, request):
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "DeleteBook.post")
-        try:
-            book = Book.objects.get(is_donated=False, donator=self.request.user, book_id=request.data['book'])
-        except:
-            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "DeleteBook.post: user {self.request.user}, book not found, response = 400")
-            return Response({"Invalid request"}, status=HTTP_400_BAD_REQUEST)
-
-        all_requests = BookRequest.objects.filter(book=book)
-        registered_users = MyUser.objects.filter(user_id__in=all_requests.values_list('user'))
+        # the refunds and the deletion are applied together or not at all
+        with transaction.atomic():
+            try:
+                book = Book.objects.select_for_update().get(is_donated=False, donator=self.request.user, book_id=request.data['book'])
+            except:
+                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "DeleteBook.post: user {self.request.user}, book not found, response = 400")
+                return Response({"Invalid request"}, status=HTTP_400_BAD_REQUEST)
 
-        # return rooyesh
-        for user in registered_users:
-            if user != self.request.user:
-                user.change_rooyesh(1)
-                user.save(update_fields=['rooyesh'])
-                logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"DeleteBook.post: user {user} rooyesh changed to {user.rooyesh}")
+            # return rooyesh, one statement for every user who requested the book
+            refunded = MyUser.objects.filter(requests_per_user__book=book).exclude(pk=self.request.user.pk).update(rooyesh=F('rooyesh') + 1)
+            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"DeleteBook.post: book {book}, rooyesh of {refunded} users increased by 1")
 
-        # delete request
-        for req in all_requests:
-            req.delete()
-            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"DeleteBook.post: request with user {req.user} and book {req.book} deleted")
+            # the requests go with the book in one cascaded delete, book_request_deleted skips their counter
+            deleted, _ = book.delete()
 
-        book.delete()
-        
-        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"DeleteBook.post: user {self.request.user}, book {book} deleted")
+        logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"DeleteBook.post: user {self.request.user}, book {book} deleted with {deleted - 1} related rows")
         return Response({'Success'}, status=HTTP_200_OK)
 
 
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from MyUser.models import MyUser
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Clears is_vip of the users whose vip_end_date has passed, one UPDATE every VIP_SWEEP_INTERVAL seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='sweep once and exit instead of repeating')
+        parser.add_argument('--interval', type=float, default=None)
+
+    def handle(self, *args, **options):
+        interval = settings.VIP_SWEEP_INTERVAL if options['interval'] is None else options['interval']
+        while True:
+            expired = MyUser.objects.expire_vips()
+            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO),
+                        f"expire_vips: {expired} users are no longer vip")
+            self.stdout.write(f'{expired} users are no longer vip')
+            if options['once']:
+                return
+            time.sleep(interval)
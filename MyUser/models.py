@@ -6,7 +6,28 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-class MyUserManager(BaseUserManager):
+class MyUserQuerySet(models.QuerySet):
+    # a user is VIP until vip_end_date; is_vip of an expired user stays True until expire_vips sweeps it
+
+    def active_vips(self):
+        return self.filter(is_vip=True, vip_end_date__gte=timezone.now())
+
+    def expired_vips(self):
+        return self.filter(is_vip=True, vip_end_date__lt=timezone.now())
+
+    def with_effective_vip(self):
+        # effective_vip is what is_user_vip returns, worked out in SQL
+        return self.annotate(effective_vip=models.Case(
+            models.When(is_vip=True, vip_end_date__gte=timezone.now(), then=models.Value(True)),
+            default=models.Value(False), output_field=models.BooleanField(),
+        ))
+
+    def expire_vips(self):
+        # clears is_vip of every expired user with one UPDATE, returns how many were expired
+        return self.expired_vips().update(is_vip=False)
+
+
+class MyUserManager(BaseUserManager.from_queryset(MyUserQuerySet)):
     def create_user(self, email, password=None, **kwargs):
         if not email:
             logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), "MyUserManager.create_user: email is None")
@@ -47,19 +68,9 @@ class MyUser(AbstractBaseUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['name', 'phone_number']
 
-    def update_vip_status(self):
-        if self.vip_end_date is None:
-            return
-        if self.vip_end_date < timezone.now():
-            self.is_vip = False
-            self.save(update_fields=['is_vip'])
-            logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"MyUser.update_vip_status: user vip status updated = {self}")
-
     def is_user_vip(self):
-        if self.vip_end_date is None:
-            return False
-        self.update_vip_status()
-        return self.is_vip
+        # computed from vip_end_date on every read, so checking it never writes
+        return self.is_vip and self.vip_end_date is not None and self.vip_end_date >= timezone.now()
 
     def set_vip(self, days):
         self.vip_end_date = timezone.now() + timezone.timedelta(days=days)
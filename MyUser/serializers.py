@@ -89,3 +89,6 @@ class UserInfoSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         exclude = ('password', 'last_login', 'is_admin', 'is_active')
+
+    # an expired VIP is reported as expired before expire_vips clears the column
+    is_vip = serializers.BooleanField(source='is_user_vip', read_only=True)
@@ -1,3 +1,5 @@
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
@@ -146,3 +148,20 @@ class CustomAuthTokenTests(APITestCase):
         # Assert
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['non_field_errors'][0], 'Unable to log in with provided credentials.')
+
+    def test_login_of_expired_vip_should_not_write_vip_status(self):
+        # Arrange
+        data = {
+            'username': self.user.email,
+            'password': 'testpassword'
+        }
+        get_user_model().objects.filter(pk=self.user.pk).update(is_vip=True, vip_end_date=timezone.now() - timedelta(days=1))
+
+        # Act
+        response = self.client.post(self.url, data, format='json')
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.is_vip, True)
+        self.assertEqual(self.user.is_user_vip(), False)
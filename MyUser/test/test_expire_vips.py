@@ -0,0 +1,60 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+
+class VipExpiryTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.active = self.create_user('active@example.com', is_vip=True, vip_end_date=now + timedelta(days=1))
+        self.expired = self.create_user('expired@example.com', is_vip=True, vip_end_date=now - timedelta(days=1))
+        self.never = self.create_user('never@example.com')
+
+    @staticmethod
+    def create_user(email, **kwargs):
+        user = get_user_model().objects.create_user(email=email, password='testpassword', name='John Doe', phone_number='123456789')
+        get_user_model().objects.filter(pk=user.pk).update(**kwargs)
+        user.refresh_from_db()
+        return user
+
+    def test_is_user_vip_of_expired_user_should_be_false_without_writing(self):
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            results = [self.active.is_user_vip(), self.expired.is_user_vip(), self.never.is_user_vip()]
+
+        # Assert
+        self.assertEqual(results, [True, False, False])
+        self.assertEqual(len(queries), 0)
+        self.expired.refresh_from_db()
+        self.assertTrue(self.expired.is_vip)
+
+    def test_active_vips_should_return_only_users_whose_vip_has_not_ended(self):
+        # Act
+        active = list(get_user_model().objects.active_vips())
+        effective = dict(get_user_model().objects.with_effective_vip().values_list('email', 'effective_vip'))
+
+        # Assert
+        self.assertEqual(active, [self.active])
+        self.assertEqual(effective, {'active@example.com': True, 'expired@example.com': False, 'never@example.com': False})
+
+    def test_expire_vips_command_should_clear_expired_users_with_one_query(self):
+        # Arrange
+        out = StringIO()
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            call_command('expire_vips', '--once', stdout=out)
+
+        # Assert
+        self.assertEqual(len(queries), 1)
+        self.assertIn('1 users are no longer vip', out.getvalue())
+        self.expired.refresh_from_db()
+        self.active.refresh_from_db()
+        self.assertFalse(self.expired.is_vip)
+        self.assertTrue(self.active.is_vip)
@@ -1,3 +1,5 @@
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
@@ -55,3 +57,16 @@ class UserInfoTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertEqual(response.data['detail'], 'Authentication credentials were not provided.')
 
+    def test_get_user_info_of_expired_vip_should_return_is_vip_false(self):
+        # Arrange
+        self.user.is_vip = True
+        self.user.vip_end_date = timezone.now() - timedelta(days=1)
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+
+        # Act
+        response = self.client.get(self.url)
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['is_vip'], False)
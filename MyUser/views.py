@@ -33,9 +33,6 @@ class CustomAuthToken(ObtainAuthToken):
         token, created = Token.objects.get_or_create(user=user)
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"CustomAuthToken.post: user = {user} logged in")
 
-        # if vip_end_date is passed, make user not vip.check for None because it can be null
-        user.update_vip_status()
-
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"CustomAuthToken.post: user = {user} vip_end_date = {user.vip_end_date}")
         logger.info("[%s] [%s] [%s]", timezone.now(), logging.getLevelName(logging.INFO), f"CustomAuthToken.post: user = {user} response = {Response}")
         return Response({
@@ -13,9 +13,6 @@ import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-import Book
-from Book.user_selection_strategy.weighted_random_user_selection import WeightedRandomUserSelectionStrategy
-from Book.user_selection_strategy.random_user_selection import RandomUserSelectionStrategy
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -113,6 +110,35 @@ MIDDLEWARE = [
 FLASK_SERVER_ADDRESS = 'http://127.0.0.1:5000'
 USE_FLASK_SERVER = False
 
+# random suggestions are drawn from an in-memory pool of undonated book ids reloaded every RANDOM_BOOK_POOL_TTL seconds
+RANDOM_BOOK_POOL_TTL = 300
+
+# AllBooks?search_mode=fulltext pages through the matches of an in-memory index rebuilt every SEARCH_INDEX_TTL seconds
+SEARCH_INDEX_TTL = 300
+
+# every call to the flask server goes through Book.utils.recommender_client with these timeouts in seconds.
+# after RECOMMENDER_BREAKER_THRESHOLD failures in a row it is not called for RECOMMENDER_BREAKER_COOLDOWN seconds
+RECOMMENDER_CONNECT_TIMEOUT = 1
+RECOMMENDER_READ_TIMEOUT = 5
+RECOMMENDER_INIT_TIMEOUT = 3600
+RECOMMENDER_POOL_SIZE = 10
+RECOMMENDER_BREAKER_THRESHOLD = 5
+RECOMMENDER_BREAKER_COOLDOWN = 30
+
+# keywords of new books are extracted by the run_keyword_jobs worker, KEYWORD_JOB_BATCH_SIZE books per recommender call.
+# a failed call is retried after KEYWORD_JOB_RETRY_DELAY seconds, doubled on every attempt, KEYWORD_JOB_MAX_ATTEMPTS times
+KEYWORD_JOB_BATCH_SIZE = 32
+KEYWORD_JOB_MAX_ATTEMPTS = 5
+KEYWORD_JOB_RETRY_DELAY = 30
+KEYWORD_JOB_MAX_RETRY_DELAY = 3600
+# seconds a worker may hold a job before another worker takes it over
+KEYWORD_JOB_TIMEOUT = 300
+KEYWORD_JOB_POLL_INTERVAL = 5
+
+# book and request lists are paged with keyset cursors, PAGE_SIZE rows unless ?page_size= asks for up to MAX_PAGE_SIZE
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 ROOT_URLCONF = 'net.urls'
 
 TEMPLATES = [
@@ -205,4 +231,10 @@ LOGGING = {
 }
 
 CORS_ORIGIN_ALLOW_ALL = True
-USER_SELECTION_STRATEGY = Book.user_selection_strategy.weighted_random_user_selection.WeightedRandomUserSelectionStrategy()
\ No newline at end of file
+# the name of the Book.user_selection_strategy.registry strategy ConfirmDonate uses when the request does not
+# name one; with a USER_SELECTION_SEED every book draws from its own seeded stream, so a draw can be replayed
+USER_SELECTION_STRATEGY = 'weighted'
+USER_SELECTION_SEED = None
+
+# VIP status is read from vip_end_date, the expire_vips command clears is_vip of the expired users every VIP_SWEEP_INTERVAL seconds
+VIP_SWEEP_INTERVAL = 3600
\ No newline at end of file
@@ -0,0 +1,121 @@
+import time
+import numpy as np
+
+
+def spherical_kmeans(vectors, nlist, iterations=10, seed=0, chunk=65536):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign(vectors, centroids, chunk)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+        # empty lists are re-seeded from random rows instead of being dropped
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def assign(vectors, centroids, chunk=65536):
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+class IVFIndex:
+    # Inverted-file index over the keyword rows of a VectorStore. Every row is
+    # bucketed under its nearest k-means centroid and a query only scores the
+    # rows in the nprobe buckets closest to each of its keywords. Rows of
+    # deleted books stay in their bucket and are filtered out until the store
+    # is compacted.
+
+    def __init__(self, store, nlist=None, nprobe=8, iterations=10, seed=0):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.build()
+
+    def build(self):
+        rows = np.flatnonzero(self.store.alive_rows())
+        nlist = self.nlist or max(1, int(np.sqrt(len(rows))))
+        nlist = max(1, min(nlist, len(rows)))
+        # training on a sample is enough, every row is assigned afterwards
+        sample = np.random.default_rng(self.seed).choice(rows, min(len(rows), 256 * nlist), replace=False)
+        self.centroids = spherical_kmeans(self.store.matrix[sample], nlist, self.iterations, self.seed) \
+            if len(rows) else np.zeros((1, self.store.matrix.shape[1]), dtype=np.float32)
+        self.trained_rows = self.store.n_rows
+        self.assignment = np.empty(0, dtype=np.int64)
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self.sync()
+
+    def sync(self):
+        # bucket the rows appended to the store since the last call
+        start = len(self.assignment)
+        if self.store.n_rows > 4 * max(self.trained_rows, 1024):
+            return self.build()
+        rows = np.arange(start, self.store.n_rows)
+        new = assign(self.store.matrix[start:self.store.n_rows], self.centroids)
+        self.assignment = np.concatenate((self.assignment, new))
+        for centroid in np.unique(new):
+            self.lists[centroid] = np.concatenate((self.lists[centroid], rows[new == centroid]))
+
+    def compact(self, kept_rows):
+        # follow a VectorStore.compact(), whose row mask renumbers every row
+        self.assignment = self.assignment[kept_rows]
+        order = np.argsort(self.assignment, kind='stable')
+        bounds = np.searchsorted(self.assignment[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+
+    def search(self, query, k, nprobe=None):
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(query @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        rows = np.concatenate([self.lists[c] for c in np.unique(probes)])
+        owners = self.store.owners(rows)
+        alive = self.store.alive[owners]
+        rows, owners = rows[alive], owners[alive]
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        row_scores = (self.store.matrix[rows] @ query.T).max(axis=1)
+        order = np.argsort(owners, kind='stable')
+        positions, starts = np.unique(owners[order], return_index=True)
+        scores = np.maximum.reduceat(row_scores[order], starts)
+        return self.store.top(scores, k, positions)
+
+    def most_similar(self, book_id, k, nprobe=None):
+        top = self.search(self.store.vectors(book_id), k, nprobe)
+        return self.store.ids[top].tolist()
+
+
+def recall_report(store, index, book_ids, topn=5, nprobes=(1, 2, 4, 8, 16, 32)):
+    # recall@topn of the approximate search against the exact scan, per nprobe setting
+    k = min(len(store), topn + 1)
+    exact = {}
+    started = time.perf_counter()
+    for book_id in book_ids:
+        exact[book_id] = set(store.most_similar(book_id, k)[1:])
+    exact_ms = 1000 * (time.perf_counter() - started) / max(len(book_ids), 1)
+
+    report = []
+    for nprobe in nprobes:
+        if nprobe > len(index.centroids):
+            break
+        hits, total = 0, 0
+        started = time.perf_counter()
+        for book_id in book_ids:
+            approx = set(index.most_similar(book_id, k, nprobe)[1:])
+            hits += len(approx & exact[book_id])
+            total += len(exact[book_id])
+        report.append({
+            'nprobe': nprobe,
+            'recall': hits / total if total else 1.0,
+            'approx_ms': 1000 * (time.perf_counter() - started) / max(len(book_ids), 1),
+            'exact_ms': exact_ms,
+        })
+    return report
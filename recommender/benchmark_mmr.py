@@ -0,0 +1,73 @@
+import time
+import numpy as np
+
+from embedRank import embedRankExtraction, embedRankExtractionBatch, vectorSimilarity
+
+
+def legacyEmbedRankExtraction(
+    all_candidates,
+    candidate_sim_text,
+    candidate_sim_candidate,
+    keyword_num=10,
+    beta=0.8,
+):
+    # the list based selection embedRankExtraction used to do, kept as the reference
+    N = int(min(len(all_candidates), keyword_num))
+
+    selected_candidates = []
+    unselected_candidates = [i for i in range(len(all_candidates))]
+    best_candidate = np.argmax(candidate_sim_text)
+    selected_candidates.append(best_candidate)
+    unselected_candidates.remove(best_candidate)
+
+    for i in range(N - 1):
+        selected_vec = np.array(selected_candidates)
+        unselected_vec = np.array(unselected_candidates)
+
+        unselected_candidate_sim_text = candidate_sim_text[unselected_vec, :]
+
+        dist_between = candidate_sim_candidate[unselected_vec][:, selected_vec]
+
+        if dist_between.ndim == 1:
+            dist_between = dist_between[:, np.newaxis]
+
+        best_candidate = np.argmax(
+            beta * unselected_candidate_sim_text
+            - (1 - beta) * np.max(dist_between, axis=1).reshape(-1, 1)
+        )
+        best_index = unselected_candidates[best_candidate]
+        selected_candidates.append(best_index)
+        unselected_candidates.remove(best_index)
+    return all_candidates[selected_candidates].tolist()
+
+
+def document(n_candidates, rng, dim=300):
+    candidates = np.array([f"candidate {i}" for i in range(n_candidates)])
+    candidates_vector = [rng.normal(size=(n_candidates, dim)).astype(np.float32)]
+    text_vector = candidates_vector[0].sum(axis=0)
+    return (candidates,) + vectorSimilarity(candidates_vector, text_vector)
+
+
+def timeit(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def benchmark(lengths=(10, 50, 200, 1000), keyword_num=10, documents=64, repeat=5, seed=0):
+    rng = np.random.default_rng(seed)
+    print(f"{'candidates':>10} {'legacy ms':>10} {'mmr ms':>10} {'batch ms':>10} {'mmr x':>8} {'batch x':>8}")
+    for n_candidates in lengths:
+        docs = [document(n_candidates, rng) for _ in range(documents)]
+        legacy_time, legacy = timeit(lambda: [legacyEmbedRankExtraction(*doc, keyword_num) for doc in docs], repeat)
+        mmr_time, mmr = timeit(lambda: [embedRankExtraction(*doc, keyword_num) for doc in docs], repeat)
+        batch_time, batch = timeit(lambda: embedRankExtractionBatch(*zip(*docs), [keyword_num] * documents), repeat)
+        assert mmr == legacy, f"embedRankExtraction should select the same keywords for {n_candidates} candidates"
+        assert batch == legacy, f"embedRankExtractionBatch should select the same keywords for {n_candidates} candidates"
+        print(f"{n_candidates:>10} {legacy_time * 1000:>10.2f} {mmr_time * 1000:>10.2f} {batch_time * 1000:>10.2f} "
+              f"{legacy_time / mmr_time:>7.1f}x {legacy_time / batch_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    benchmark()
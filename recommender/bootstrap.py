@@ -0,0 +1,154 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import embedRank
+from embeddingCache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+def keyword_count(summary):
+    return max(4, len(summary.split()) / 8)
+
+
+class BootstrapProgress:
+
+    def __init__(self, total, reused=0):
+        # reused books were taken over from a snapshot, they count as done but not in books_per_sec
+        self.total = total
+        self.reused = reused
+        self.done = reused
+        self.failed = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def update(self, results):
+        for book_id, keywords, vectors, error in results:
+            self.done += 1
+            if error is not None:
+                self.failed[book_id] = error
+        logger.info('init_model: %d/%d books, %.1f books/sec, %d failed',
+                    self.done, self.total, self.books_per_sec(), len(self.failed))
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        logger.info('init_model: finished %d books in %.1f sec, %.1f books/sec, %d reused, %d failed',
+                    self.done, self.finished - self.started, self.books_per_sec(), self.reused, len(self.failed))
+
+    def books_per_sec(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return (self.done - self.reused) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'done': self.done,
+            'reused': self.reused,
+            'failed': self.failed,
+            'books_per_sec': self.books_per_sec(),
+            'finished': self.finished is not None,
+        }
+
+
+def batch_keywords(summaries, embedding_model, posTagger, max_candidates=None):
+    # the keywords of every summary, or the exception extracting them raised
+    try:
+        return embedRank.embedRankBatch(
+            summaries, [keyword_count(summary) for summary in summaries], embedding_model, posTagger, return_exceptions=True,
+            max_candidates=max_candidates
+        )
+    except Exception as e:
+        # a failure in the shared tagging pass should only cost the books that cause it
+        if len(summaries) == 1:
+            return [e]
+        return [keywords for summary in summaries for keywords in batch_keywords([summary], embedding_model, posTagger, max_candidates)]
+
+
+def stream_keywords(summary, embedding_model, posTagger, max_candidates=None):
+    # the keywords of a long summary tagged a chunk of sentences at a time, or the exception extracting them raised
+    try:
+        if max_candidates is None:
+            return embedRank.embedRankStream(summary, keyword_count(summary), embedding_model, posTagger)
+        return embedRank.embedRankStream(summary, keyword_count(summary), embedding_model, posTagger, max_candidates)
+    except Exception as e:
+        return e
+
+
+def extract_batch(items, embedding_model, posTagger, max_candidates=None, stream_summary_words=None):
+    # items are (book_id, summary) pairs, every result is (book_id, keywords, raw vectors, error).
+    # summaries longer than stream_summary_words words are streamed instead of batched
+    summaries = [summary for _, summary in items]
+    streamed = [stream_summary_words is not None and len(summary.split()) > stream_summary_words for summary in summaries]
+    batched = [summary for summary, stream in zip(summaries, streamed) if not stream]
+    batched_keywords = iter(batch_keywords(batched, embedding_model, posTagger, max_candidates) if batched else [])
+    all_keywords = [
+        stream_keywords(summary, embedding_model, posTagger, max_candidates) if stream else next(batched_keywords)
+        for summary, stream in zip(summaries, streamed)
+    ]
+
+    keyword_lists = [np.unique(keywords).tolist() if not isinstance(keywords, Exception) else [] for keywords in all_keywords]
+    vectors = {keyword: embedding_model[keyword] for keyword in set().union(*map(set, keyword_lists))}
+    results = []
+    for (book_id, _), keywords, outcome in zip(items, keyword_lists, all_keywords):
+        if isinstance(outcome, Exception):
+            results.append((book_id, None, None, repr(outcome)))
+        elif not keywords:
+            results.append((book_id, None, None, 'no keywords extracted'))
+        else:
+            results.append((book_id, keywords, np.array([vectors[keyword] for keyword in keywords]), None))
+    return results
+
+
+_worker_models = None
+
+
+def _init_worker(sent2vec_path, posTagger_path, max_candidates, stream_summary_words):
+    global _worker_models
+    _worker_models = (
+        EmbeddingCache(embedRank.getSent2vecModel(sent2vec_path)), embedRank.getPosTaggerModel(posTagger_path), max_candidates,
+        stream_summary_words
+    )
+
+
+def _extract_in_worker(items):
+    try:
+        return extract_batch(items, *_worker_models)
+    except Exception as e:
+        return [(book_id, None, None, repr(e)) for book_id, _ in items]
+
+
+def bootstrap(book_data, embedding_model, posTagger, pca, progress, batch_size=64, workers=1,
+              sent2vec_path=None, posTagger_path=None, max_candidates=None, stream_summary_words=None):
+    # keywords and PCA-reduced vectors of a whole catalog, in book_data order.
+    # with workers > 1 every worker process loads its own models from the given paths
+    items = [(int(book_id), summary) for book_id, summary in book_data.items()]
+    batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+
+    ids, keywords, raw_vectors, lengths = [], {}, [], []
+
+    def collect(results):
+        progress.update(results)
+        for book_id, book_keywords, vectors, error in results:
+            if error is None:
+                ids.append(book_id)
+                keywords[book_id] = book_keywords
+                raw_vectors.append(vectors)
+                lengths.append(len(vectors))
+
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(sent2vec_path, posTagger_path, max_candidates, stream_summary_words)) as pool:
+            for results in pool.map(_extract_in_worker, batches):
+                collect(results)
+    else:
+        for batch in batches:
+            try:
+                collect(extract_batch(batch, embedding_model, posTagger, max_candidates, stream_summary_words))
+            except Exception as e:
+                collect([(book_id, None, None, repr(e)) for book_id, _ in batch])
+
+    # one PCA transform over the keyword vectors of the whole catalog
+    vectors = pca.transform(np.concatenate(raw_vectors)) if raw_vectors else np.empty((0, pca.n_components_))
+    progress.finish()
+    return ids, keywords, vectors, lengths
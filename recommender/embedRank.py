@@ -5,10 +5,16 @@ from hazm import (
     POSTagger,
     SentEmbedding
 )
+import logging
+import threading
+import time
+from functools import lru_cache
+from itertools import islice
 import nltk
 import numpy as np
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
+from embeddingCache import EmbeddingCache
 
 grammers = [
 """
@@ -26,26 +32,71 @@ NP:
 
 normalizer = Normalizer()
 
+logger = logging.getLogger(__name__)
+
+# models loaded from disk once per process, keyed by (class, path) and shared read-only by every thread
+_models = {}
+_models_lock = threading.Lock()
+
+def loadModel(model_class, model_path):
+    model = _models.get((model_class, model_path))
+    if model is None:
+        with _models_lock:
+            model = _models.get((model_class, model_path))
+            if model is None:
+                started = time.perf_counter()
+                model = model_class(model_path)
+                logger.info('loaded %s from %s in %.2f sec', model_class.__name__, model_path, time.perf_counter() - started)
+                _models[(model_class, model_path)] = model
+    return model
+
+def getSent2vecModel(sent2vec_model_path="sent2vec.model"):
+    return loadModel(SentEmbedding, sent2vec_model_path)
+
+def getPosTaggerModel(pos_model_path="POStagger.model"):
+    return loadModel(POSTagger, pos_model_path)
+
+@lru_cache(maxsize=None)
+def getGrammerParser(grammer):
+    return nltk.RegexpParser(grammer)
+
+def textVector(sent2vec_model, candidates):
+    # the joined candidates of a text are not looked up again, so they skip the phrase cache
+    if isinstance(sent2vec_model, EmbeddingCache):
+        sent2vec_model = sent2vec_model.model
+    return sent2vec_model[" ".join(candidates)]
+
 def text2vec(candidates, sent2vec_model_path="sent2vec.model", sent2vecModel=None):
     if sent2vecModel is None:
-        sent2vec_model = SentEmbedding(sent2vec_model_path)
+        sent2vec_model = getSent2vecModel(sent2vec_model_path)
     else:
         sent2vec_model = sent2vecModel
     candidate_vector = [[sent2vec_model[candidate] for candidate in candidates]]
-    text_vector = sent2vec_model[" ".join(candidates)]
+    text_vector = textVector(sent2vec_model, candidates)
     return candidate_vector, text_vector
 
 def posTagger(text, pos_model_path="POStagger.model", posTaggerModel=None):
     tokens = [word_tokenize(sent) for sent in sent_tokenize(normalizer.normalize(text))]
     if posTaggerModel is None:
-        tagger = POSTagger(pos_model_path)
+        tagger = getPosTaggerModel(pos_model_path)
     else:
         tagger = posTaggerModel
     return tagger.tag_sents(tokens)
 
+def posTaggerBatch(texts, pos_model_path="POStagger.model", posTaggerModel=None):
+    # tags the sentences of every text in one tag_sents call, then splits them back per text
+    texts_tokens = [[word_tokenize(sent) for sent in sent_tokenize(normalizer.normalize(text))] for text in texts]
+    if posTaggerModel is None:
+        tagger = getPosTaggerModel(pos_model_path)
+    else:
+        tagger = posTaggerModel
+    tagged = tagger.tag_sents([tokens for text_tokens in texts_tokens for tokens in text_tokens])
+    bounds = np.cumsum([0] + [len(text_tokens) for text_tokens in texts_tokens])
+    return [tagged[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
 def extractGrammer(tagged_text, grammer):
     keyphrase_candidate = set()
-    np_parser = nltk.RegexpParser(grammer)
+    np_parser = getGrammerParser(grammer)
     trees = np_parser.parse_sents(tagged_text)
     for tree in trees:
         for subtree in tree.subtrees(
@@ -70,34 +121,74 @@ def embedRankExtraction(
     keyword_num=10,
     beta=0.8,
 ):
-    
+    # maximal marginal relevance: the running max similarity of every candidate to the
+    # selected ones is updated with the column of the latest pick, so a step is one pass
     N = int(min(len(all_candidates), keyword_num))
 
-    selected_candidates = []
-    unselected_candidates = [i for i in range(len(all_candidates))]
-    best_candidate = np.argmax(candidate_sim_text)
-    selected_candidates.append(best_candidate)
-    unselected_candidates.remove(best_candidate)
+    relevance = beta * np.ravel(candidate_sim_text)
+    selected = np.zeros(len(relevance), dtype=bool)
+    best_index = np.argmax(candidate_sim_text)
+    selected_candidates = [best_index]
+    selected[best_index] = True
+    max_sim = candidate_sim_candidate[:, best_index]
 
     for i in range(N - 1):
-        selected_vec = np.array(selected_candidates)
-        unselected_vec = np.array(unselected_candidates)
+        scores = relevance - (1 - beta) * max_sim
+        scores[selected] = -np.inf
+        best_index = np.argmax(scores)
+        if selected[best_index]:
+            # only when every unselected score is -inf, where the first unselected one wins
+            best_index = np.argmin(selected)
+        selected_candidates.append(best_index)
+        selected[best_index] = True
+        max_sim = np.maximum(max_sim, candidate_sim_candidate[:, best_index])
+    return all_candidates[selected_candidates].tolist()
 
-        unselected_candidate_sim_text = candidate_sim_text[unselected_vec, :]
 
-        dist_between = candidate_sim_candidate[unselected_vec][:, selected_vec]
+def embedRankExtractionBatch(
+    all_candidates,
+    candidate_sim_texts,
+    candidate_sim_candidates,
+    keyword_nums,
+    beta=0.8,
+):
+    # embedRankExtraction over many documents at once, padded to the longest candidate list
+    lengths = np.array([len(candidates) for candidates in all_candidates])
+    if len(lengths) == 0:
+        return []
+    if lengths.min() == 0:
+        raise ValueError("every document needs at least one candidate")
+    size = lengths.max()
+    N = np.minimum(lengths, np.asarray(keyword_nums)).astype(int)
+    rows = np.arange(len(lengths))
+
+    # same dtype as the per-document matrices, so every score matches embedRankExtraction bit for bit
+    dtype = np.result_type(*candidate_sim_texts, *candidate_sim_candidates)
+    relevance = np.full((len(lengths), size), -np.inf, dtype=dtype)
+    sim_candidate = np.zeros((len(lengths), size, size), dtype=dtype)
+    for row, (sim_text, sim_cand) in enumerate(zip(candidate_sim_texts, candidate_sim_candidates)):
+        relevance[row, :lengths[row]] = beta * np.ravel(sim_text)
+        sim_candidate[row, :lengths[row], :lengths[row]] = sim_cand
+    # padding counts as selected so it is never picked
+    selected = np.arange(size)[None, :] >= lengths[:, None]
 
-        if dist_between.ndim == 1:
-            dist_between = dist_between[:, np.newaxis]
+    best_index = np.argmax(relevance, axis=1)
+    picks = [best_index]
+    selected[rows, best_index] = True
+    max_sim = sim_candidate[rows, :, best_index]
 
-        best_candidate = np.argmax(
-            beta * unselected_candidate_sim_text
-            - (1 - beta) * np.max(dist_between, axis=1).reshape(-1, 1)
-        )
-        best_index = unselected_candidates[best_candidate]
-        selected_candidates.append(best_index)
-        unselected_candidates.remove(best_index)
-    return all_candidates[selected_candidates].tolist()
+    for i in range(N.max() - 1):
+        scores = relevance - (1 - beta) * max_sim
+        scores[selected] = -np.inf
+        best_index = np.argmax(scores, axis=1)
+        stuck = selected[rows, best_index]
+        best_index[stuck] = np.argmin(selected[stuck], axis=1)
+        picks.append(best_index)
+        selected[rows, best_index] = True
+        max_sim = np.maximum(max_sim, sim_candidate[rows, :, best_index])
+
+    picks = np.stack(picks, axis=1)
+    return [candidates[picks[row, :N[row]]].tolist() for row, candidates in enumerate(all_candidates)]
 
 
 def vectorSimilarity(candidates_vector, text_vector, norm=True):
@@ -122,8 +213,19 @@ def vectorSimilarity(candidates_vector, text_vector, norm=True):
     return candidate_sim_text, candidate_sim_candidate
 
 
-def extractKeyword(candidates, keyword_num=5, sent2vecModel=None):
+def topCandidates(candidates, candidates_vector, text_vector, max_candidates=None):
+    # the max_candidates candidates closest to the text, in their original order, so the
+    # pairwise similarity matrix of MMR stays max_candidates x max_candidates at most
+    if max_candidates is None or len(candidates) <= max_candidates:
+        return candidates, candidates_vector
+    candidate_sim_text = cosine_similarity(candidates_vector[0], text_vector.reshape(1, -1)).ravel()
+    keep = np.sort(np.argsort(-candidate_sim_text, kind="stable")[:max_candidates])
+    return candidates[keep], [np.asarray(candidates_vector[0])[keep]]
+
+
+def extractKeyword(candidates, keyword_num=5, sent2vecModel=None, max_candidates=None):
     candidates_vector, text_vector = text2vec(candidates, sent2vecModel=sent2vecModel)
+    candidates, candidates_vector = topCandidates(candidates, candidates_vector, text_vector, max_candidates)
     candidate_sim_text_norm, candidate_sim_candidate_norm = vectorSimilarity(
         candidates_vector, text_vector
     )
@@ -132,10 +234,103 @@ def extractKeyword(candidates, keyword_num=5, sent2vecModel=None):
     )
 
 
-def embedRank(text, keyword_num, sent2vecModel=None, posTaggerModel=None):
+def embedRank(text, keyword_num, sent2vecModel=None, posTaggerModel=None, max_candidates=None):
     token_tag = posTagger(text, posTaggerModel=posTaggerModel)
     candidates = extractCandidates(token_tag)
-    return extractKeyword(candidates, keyword_num, sent2vecModel=sent2vecModel)
+    return extractKeyword(candidates, keyword_num, sent2vecModel=sent2vecModel, max_candidates=max_candidates)
+
+
+def sentenceStream(text):
+    # tokens of one sentence at a time; text is a string or an iterable of pieces that end on sentence boundaries
+    pieces = [text] if isinstance(text, str) else text
+    for piece in pieces:
+        for sent in sent_tokenize(normalizer.normalize(piece)):
+            yield word_tokenize(sent)
+
+
+def embedRankStream(text, keyword_num, sent2vecModel=None, posTaggerModel=None, max_candidates=256, chunk_sentences=64):
+    # embedRank for texts of any length: sentences are tagged chunk_sentences at a time and at most
+    # 2 * max_candidates candidate vectors are held. The text vector is the running sum of the candidate
+    # vectors weighted by their word counts, which points where sent2vec of the joined candidates does
+    sent2vec_model = getSent2vecModel() if sent2vecModel is None else sent2vecModel
+    tagger = getPosTaggerModel() if posTaggerModel is None else posTaggerModel
+    sentences = sentenceStream(text)
+    pool = {}
+    text_vector = None
+
+    def prune(size):
+        candidates = np.array(list(pool))
+        kept, _ = topCandidates(candidates, [np.array(list(pool.values()))], text_vector, size)
+        return {candidate: pool[candidate] for candidate in kept}
+
+    while True:
+        chunk = list(islice(sentences, chunk_sentences))
+        if not chunk:
+            break
+        candidates = extractCandidates(tagger.tag_sents(chunk))
+        if not len(candidates):
+            continue
+        vectors = np.array([sent2vec_model[candidate] for candidate in candidates])
+        chunk_vector = np.array([len(candidate.split()) for candidate in candidates]) @ vectors
+        text_vector = chunk_vector if text_vector is None else text_vector + chunk_vector
+        pool.update(zip(candidates, vectors))
+        if len(pool) > 2 * max_candidates:
+            pool = prune(max_candidates)
+
+    if text_vector is None:
+        raise ValueError("no keyphrase candidates in the text")
+    pool = prune(max_candidates)
+    candidate_sim_text_norm, candidate_sim_candidate_norm = vectorSimilarity(
+        [np.array(list(pool.values()))], text_vector
+    )
+    return embedRankExtraction(
+        np.array(list(pool)), candidate_sim_text_norm, candidate_sim_candidate_norm, keyword_num
+    )
+
+
+def embedRankBatch(texts, keyword_nums, sent2vecModel=None, posTaggerModel=None, return_exceptions=False, budget=2 ** 24,
+                   max_candidates=None, batch_max_candidates=128):
+    # embedRank over many texts: one tagging pass and every distinct candidate embedded once.
+    # with return_exceptions a failing text yields its exception instead of failing the batch.
+    # texts of more than batch_max_candidates candidates run their own MMR: the padded batch
+    # rescans whole rows every round and falls behind per text MMR past about 150 candidates
+    sent2vec_model = getSent2vecModel() if sent2vecModel is None else sent2vecModel
+    all_candidates = [extractCandidates(tagged_text) for tagged_text in posTaggerBatch(texts, posTaggerModel=posTaggerModel)]
+    vectors = {candidate: sent2vec_model[candidate] for candidate in set().union(*map(set, all_candidates))}
+    results = [None] * len(texts)
+    similarities = {}
+    for index, candidates in enumerate(all_candidates):
+        try:
+            candidates_vector = [[vectors[candidate] for candidate in candidates]]
+            text_vector = textVector(sent2vec_model, candidates)
+            all_candidates[index], candidates_vector = topCandidates(candidates, candidates_vector, text_vector, max_candidates)
+            similarities[index] = vectorSimilarity(candidates_vector, text_vector)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[index] = e
+
+    for index in [index for index in similarities if len(all_candidates[index]) > batch_max_candidates]:
+        results[index] = embedRankExtraction(all_candidates[index], *similarities.pop(index), keyword_nums[index])
+
+    # texts of similar length share one padded MMR run of at most budget similarities
+    order = sorted(similarities, key=lambda index: len(all_candidates[index]))
+    start = 0
+    while start < len(order):
+        stop = start + 1
+        while stop < len(order) and (stop + 1 - start) * len(all_candidates[order[stop]]) ** 2 <= budget:
+            stop += 1
+        chunk = order[start:stop]
+        keywords = embedRankExtractionBatch(
+            [all_candidates[index] for index in chunk],
+            [similarities[index][0] for index in chunk],
+            [similarities[index][1] for index in chunk],
+            [keyword_nums[index] for index in chunk],
+        )
+        for index, text_keywords in zip(chunk, keywords):
+            results[index] = text_keywords
+        start = stop
+    return results
 
 
 # if __name__ == "__main__":
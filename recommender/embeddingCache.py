@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class EmbeddingCache:
+    # Bounded, thread-safe memo of phrase -> vector in front of a sent2vec
+    # model. It is used like the model itself (cache[phrase]), so it can be
+    # handed to embedRank wherever a model is expected. Cached vectors are
+    # read-only because the same array is returned on every hit.
+
+    def __init__(self, model, maxsize=200000):
+        self.model = model
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, phrase):
+        with self.lock:
+            vector = self.entries.get(phrase)
+            if vector is not None:
+                self.entries.move_to_end(phrase)
+                self.hits += 1
+                return vector
+            self.misses += 1
+        # the model is only read, so embedding runs outside the lock
+        vector = np.array(self.model[phrase])
+        vector.setflags(write=False)
+        with self.lock:
+            self.entries[phrase] = vector
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return vector
+
+    def __getattr__(self, name):
+        # everything else is the model's; model itself is missing only while unpickling
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
+
+    def save(self, path, model=None):
+        # model identifies the wrapped model, load() skips a file saved for another one
+        with self.lock:
+            phrases = list(self.entries)
+            vectors = list(self.entries.values())
+        if not vectors:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written next to the target and renamed, so a reader never sees half a file
+        tmp_path = path + '.tmp.npz'
+        # one JSON string, a string array would pad every phrase to the length of the longest
+        np.savez(tmp_path, phrases=np.array(json.dumps(phrases, ensure_ascii=False)), vectors=np.stack(vectors),
+                 model=np.array(json.dumps(model)))
+        os.replace(tmp_path, path)
+
+    def load(self, path, model=None, dimension=None):
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            # a file that does not name the model it was saved for is not trusted either
+            if 'model' not in data.files or json.loads(str(data['model'])) != model:
+                return 0
+            if dimension is not None and data['vectors'].shape[1] != dimension:
+                return 0
+            phrases, vectors = json.loads(str(data['phrases'])), data['vectors']
+        vectors.setflags(write=False)
+        with self.lock:
+            for phrase, vector in zip(phrases[-self.maxsize:], vectors[-self.maxsize:]):
+                self.entries[phrase] = vector
+        return len(phrases)
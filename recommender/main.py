@@ -1,11 +1,18 @@
+import logging
+import os
+import threading
+import time
 import numpy as np
-from hazm import SentEmbedding
-from sklearn.metrics.pairwise import cosine_similarity
 import embedRank
 import joblib
-import heapq
+from bootstrap import BootstrapProgress, bootstrap, extract_batch
+from vectorStore import VectorStore, normalize_rows
+from annIndex import IVFIndex, recall_report
+from neighbourTable import NeighbourTable
+from resultCache import ResultCache
+from embeddingCache import EmbeddingCache
+from snapshot import Snapshots, file_identity, fingerprint
 from flask import Flask, request, make_response, jsonify
-from hazm import POSTagger
 
 big_sample_text = 'سفارت ایران در مادرید درباره فیلم منتشرشده از «حسن قشقاوی» در مراسم سال نو در کاخ سلطنتی اسپانیا و حاشیه‌سازی‌ها در فضای مجازی اعلام کرد: به تشریفات دربار کتباً اعلام شد سفیر بدون همراه در مراسم حضور خواهد داشت و همچون قبل به دلایل تشریفاتی نمی‌تواند با ملکه دست بدهد. همان‌گونه که کارشناس رسمی تشریفات در توضیحات خود به یک نشریه اسپانیایی گفت این موضوع توضیح مذهبی داشته و هرگز به معنی بی‌احترامی به مقام و شخصیت زن آن هم در سطح ملکه محترمه یک کشور نیست.'
 small_sample_text = 'در جنگل ایران گونه‌های جانوری زیادی وجود دارد.'
@@ -21,53 +28,310 @@ sent2vec_path = r'/Users/e_ghafour/models/hazm/sent2vec/sent2vec-naab.model'
 posTagger_path = r'/Users/e_ghafour/models/hazm/pos_tagger.model'
 pca_path = r'/Users/e_ghafour/repos/kahroba/Internet-Engineering-Project/recommender/pca_sent2vec-naab.model'
 
+# approximate ask_book: buckets probed per keyword, raise it for recall, lower it for latency
+ann_nprobe = 8
+
+# exact ask_book answers up to neighbour_k suggestions from a precomputed neighbour table, which is
+# built in a background thread after init_model and saved with the snapshots
+neighbour_k = 10
+
+# ask_book results are cached for cache_ttl seconds, at most cache_size of them
+cache_size = 10000
+cache_ttl = 300
+
+# /search keeps the sent2vec vectors of up to query_cache_size recent queries
+query_cache_size = 10000
+
+# the latest snapshot is loaded on startup, a new one is written every snapshot_every journaled changes
+snapshot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+snapshot_every = 1000
+
+# phrase embeddings are memoized in front of sent2vec and saved as embedding_cache_file of the snapshot
+# directory with every snapshot, None keeps them in memory only
+embedding_cache_size = 200000
+embedding_cache_file = 'embeddings.npz'
+
+# keyword extraction keeps the max_candidates candidates closest to the summary before the pairwise
+# similarities of MMR, summaries longer than stream_summary_words are tagged a chunk of sentences at a time
+max_candidates = 512
+stream_summary_words = 20000
+
+# init_model embeds bootstrap_batch_size summaries per batch, spread over bootstrap_workers processes
+bootstrap_batch_size = 64
+bootstrap_workers = 1
+
+logger = logging.getLogger(__name__)
+
 class SingletonRecommender:
+    # held by inserts, deletes and snapshots, and by the neighbour build while it copies the store and
+    # adopts its table, but not during the build itself
+    lock = threading.RLock()
 
     def __new__(cls):
         if not hasattr(cls, 'instance'):
             cls.instance = super(SingletonRecommender, cls).__new__(cls)
         return cls.instance
 
-    def init_model(self, book_data, sent2vec_path=sent2vec_path, posTagger_path=posTagger_path):
-        self.embedding_model = SentEmbedding(model_path= sent2vec_path)
-        self.posTagger = POSTagger(model = posTagger_path)
+    def load_models(self, sent2vec_path=sent2vec_path, posTagger_path=posTagger_path):
+        self.embedding_model = EmbeddingCache(embedRank.getSent2vecModel(sent2vec_path), embedding_cache_size)
+        self.query_embeddings = EmbeddingCache(self.embedding_model.model, query_cache_size)
+        self.posTagger = embedRank.getPosTaggerModel(posTagger_path)
         self.pca = joblib.load(pca_path)
-        tmp_dic = {}
-        for item in book_data:
-            summary = book_data[item]
-            item = int(item)
-            keywords = np.unique(embedRank.embedRank(summary, max(4, len(summary.split()) / 8), self.embedding_model, self.posTagger))
-            # tmp_dic[item] = [self.embedding_model[keyword] for keyword in keywords]
-            tmp_dic[item] = self.pca.transform([self.embedding_model[keyword] for keyword in keywords]).tolist()
-        self.book_data = tmp_dic
+        # saved with every snapshot, vectors of other models are never loaded
+        self.models = {'sent2vec': file_identity(sent2vec_path), 'pca': file_identity(pca_path)}
+
+    def _load_embedding_cache(self, snapshot_dir):
+        # phrases embedded by another model, or of another dimension than the PCA takes, are not loaded
+        if embedding_cache_file is not None:
+            self.embedding_model.load(os.path.join(snapshot_dir, embedding_cache_file), self.models['sent2vec'], self.pca.n_features_in_)
+
+    def init_model(self, book_data, sent2vec_path=sent2vec_path, posTagger_path=posTagger_path, snapshot_dir=snapshot_dir,
+                   workers=bootstrap_workers, batch_size=bootstrap_batch_size):
+        self.load_models(sent2vec_path, posTagger_path)
+        self._load_embedding_cache(snapshot_dir)
+        book_data = {int(book_id): str(summary) for book_id, summary in book_data.items()}
+        fingerprints = {book_id: fingerprint(summary) for book_id, summary in book_data.items()}
+
+        # books whose summary is the one in the latest snapshot keep their keywords and vectors,
+        # so restarting Django together with this server only extracts new and edited books
+        snapshots = Snapshots(snapshot_dir)
+        previous = snapshots.load(self.models)
+        reused, old_store, old_keywords = [], None, {}
+        if previous is not None:
+            old_store, old_keywords, old_fingerprints, _ = previous
+            reused = [book_id for book_id, value in fingerprints.items()
+                      if old_fingerprints.get(book_id) == value and book_id in old_store]
+
+        self.progress = BootstrapProgress(len(book_data), reused=len(reused))
+        reused_ids = set(reused)
+        ids, self.keywords, vectors, lengths = bootstrap(
+            {book_id: summary for book_id, summary in book_data.items() if book_id not in reused_ids},
+            self.embedding_model, self.posTagger, self.pca, self.progress,
+            batch_size, workers, sent2vec_path, posTagger_path, max_candidates, stream_summary_words
+        )
+        self.store = VectorStore()
+        if reused:
+            old_vectors = [old_store.vectors(book_id) for book_id in reused]
+            self.store.insert_many(reused, np.concatenate(old_vectors), [len(rows) for rows in old_vectors])
+            self.keywords.update({book_id: old_keywords[book_id] for book_id in reused})
+        self.store.insert_many(ids, vectors, lengths)
+        self.fingerprints = {book_id: fingerprints[book_id] for book_id in reused + ids}
+        self.snapshots = snapshots
+        self._reset_indexes()
+        self.save_snapshot()
+
+    def warm_start(self, sent2vec_path=sent2vec_path, posTagger_path=posTagger_path, snapshot_dir=snapshot_dir):
+        self.load_models(sent2vec_path, posTagger_path)
+        self._load_embedding_cache(snapshot_dir)
+        snapshots = Snapshots(snapshot_dir)
+        loaded = snapshots.load(self.models)
+        if loaded is None:
+            return False
+        self.store, self.keywords, self.fingerprints, neighbours = loaded
+        self.snapshots = snapshots
+        self._reset_indexes(neighbours)
+        return True
+
+    def _reset_indexes(self, neighbours=None):
+        self.ann_index = None
+        self.cache = ResultCache(cache_size, cache_ttl)
+        with self.lock:
+            self.neighbour_table = neighbours if neighbours is not None and neighbours.size == neighbour_k + 1 else None
+            self.neighbour_changes = None
+            self.neighbour_thread = None
+            if self.neighbour_table is None:
+                # exact asks are answered by a scan of the store until the table is ready
+                self.neighbour_thread = threading.Thread(target=self._build_neighbours, args=(self.store,), daemon=True)
+                self.neighbour_thread.start()
+
+    def _build_neighbours(self, store):
+        # the O(N²) build runs on a copy, the inserts and deletes made meanwhile are replayed on its table
+        with self.lock:
+            if self.store is not store:
+                return
+            copy = store.compacted_copy()
+            self.neighbour_changes = []
+        started = time.perf_counter()
+        table = NeighbourTable(copy, neighbour_k)
+        with self.lock:
+            if self.store is not store:
+                return
+            table.rebind(store)
+            for deleted, inserted in self.neighbour_changes:
+                table.delete(deleted)
+                table.insert(inserted)
+            self.neighbour_table = table
+            self.neighbour_changes = None
+            logger.info('neighbour table of %d books built in %.1f sec', len(copy), time.perf_counter() - started)
+            self.save_snapshot()
+
+    def _update_neighbours(self, deleted, inserted):
+        # call with the lock held, after the store changed
+        if self.neighbour_table is not None:
+            self.neighbour_table.delete(deleted)
+            self.neighbour_table.insert(inserted)
+        elif self.neighbour_changes is not None:
+            self.neighbour_changes.append((deleted, inserted))
+
+    def wait_for_neighbours(self, timeout=None):
+        thread = self.neighbour_thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.neighbour_table is not None
+
+    def save_snapshot(self):
+        with self.lock:
+            if embedding_cache_file is not None:
+                self.embedding_model.save(os.path.join(self.snapshots.directory, embedding_cache_file), self.models['sent2vec'])
+            return self.snapshots.save(self.store, self.keywords, self.fingerprints, self.models, self.neighbour_table)
 
     def insert_book(self, id: int, summary: str):
-        keywords = np.unique(embedRank.embedRank(summary, max(4, len(summary.split()) / 8), self.embedding_model, self.posTagger))
-        # self.book_data[id] = [self.embedding_model[keyword] for keyword in keywords]
-        self.book_data[id] = self.pca.transform([self.embedding_model[keyword] for keyword in keywords]).tolist()
+        keyword_num = max(4, len(summary.split()) / 8)
+        if len(summary.split()) > stream_summary_words:
+            keywords = embedRank.embedRankStream(summary, keyword_num, self.embedding_model, self.posTagger, max_candidates)
+        else:
+            keywords = embedRank.embedRank(summary, keyword_num, self.embedding_model, self.posTagger, max_candidates)
+        keywords = np.unique(keywords)
+        self._add_books([id], {id: keywords.tolist()}, self.pca.transform([self.embedding_model[keyword] for keyword in keywords]), [len(keywords)],
+                        {id: fingerprint(summary)})
         # return keywords in list
         return keywords.tolist()
 
+    def insert_books(self, books):
+        # books are (id, summary) pairs; a repeated id keeps its last summary like repeated insert_book calls
+        books = list(dict(books).items())
+        summaries = dict(books)
+        ids, keywords, raw_vectors, lengths, errors = [], {}, [], [], {}
+        for start in range(0, len(books), bootstrap_batch_size):
+            for book_id, book_keywords, vectors, error in extract_batch(books[start:start + bootstrap_batch_size], self.embedding_model, self.posTagger, max_candidates, stream_summary_words):
+                if error is not None:
+                    errors[book_id] = error
+                    continue
+                ids.append(book_id)
+                keywords[book_id] = book_keywords
+                raw_vectors.append(vectors)
+                lengths.append(len(vectors))
+        if ids:
+            # one PCA transform for the keyword vectors of the whole batch
+            self._add_books(ids, keywords, self.pca.transform(np.concatenate(raw_vectors)), lengths,
+                            {book_id: fingerprint(summaries[book_id]) for book_id in ids})
+        return keywords, errors
+
+    def _add_books(self, ids, keywords, vectors, lengths, fingerprints):
+        with self.lock:
+            replaced = [book_id for book_id in ids if book_id in self.store]
+            self.store.insert_many(ids, vectors, lengths)
+            for book_id in ids:
+                self.keywords[book_id] = keywords[book_id]
+                self.fingerprints[book_id] = fingerprints[book_id]
+                self.snapshots.log_insert(book_id, self.store.vectors(book_id), keywords[book_id], fingerprints[book_id])
+            if self.ann_index is not None:
+                self.ann_index.sync()
+            self._update_neighbours(replaced, ids)
+            # a new book can enter any result
+            self.cache.bump()
+            self._maybe_snapshot()
+
+    def _maybe_snapshot(self):
+        if self.snapshots.pending >= snapshot_every:
+            self.save_snapshot()
+
     def delete_book(self, id):
-        if(id in self.book_data.keys()):
-            self.book_data.pop(id)
+        self.delete_books([id])
 
-    def ask_book(self, id: int, topn=5):
-        selected_vec = self.book_data[id]
-        sim_dic = {}
-        # for i in self.book_data:
-        #     sim_dic[i] = np.max(cosine_similarity(selected_vec, self.book_data[i]))
-        sim_dic = {i:np.max(cosine_similarity(selected_vec, self.book_data[i])) for i in self.book_data}
-        topn += 1 
-        topn = min(len(self.book_data), topn)
+    def delete_books(self, ids):
+        deleted = []
+        with self.lock:
+            for book_id in ids:
+                if self.store.delete(book_id):
+                    self.keywords.pop(book_id, None)
+                    self.fingerprints.pop(book_id, None)
+                    self.snapshots.log_delete(book_id)
+                    deleted.append(book_id)
+            self._update_neighbours(deleted, [])
+            self.cache.invalidate(deleted)
+            self._maybe_snapshot()
+            if self.store.needs_compaction():
+                # a table still being built is rebound to the new positions when it is adopted
+                kept, kept_rows = self.store.compact()
+                if self.ann_index is not None:
+                    self.ann_index.compact(kept_rows)
+                if self.neighbour_table is not None:
+                    self.neighbour_table.compact(kept)
+        return deleted
 
-        similar_indices = heapq.nlargest(topn, sim_dic, key=sim_dic.get)
-        # similar_indices = sorted(sim_dic, key=sim_dic.get, reverse=True)
+    def ask_book(self, id: int, topn=5, mode='exact'):
+        cached = self.cache.get((id, topn, mode))
+        if cached is not None:
+            return list(cached)
+        similar_indices = self._ask_book(id, topn, mode)
+        self.cache.put((id, topn, mode), tuple(similar_indices))
+        return similar_indices
+
+    def _ask_book(self, id, topn, mode):
+        topn += 1
+        topn = min(len(self.store), topn)
+
+        neighbour_table = self.neighbour_table
+        if mode == 'approx':
+            similar_indices = self.ann().most_similar(id, topn)
+        elif topn <= neighbour_k + 1 and neighbour_table is not None:
+            similar_indices = neighbour_table.neighbours(id, topn)
+        else:
+            # one matrix product over every keyword row, then a segmented max per book
+            similar_indices = self.store.most_similar(id, topn)
 
         return similar_indices[1:]
-    
+
+    def ask_books(self, ids, topn=5):
+        # ids that are not in the model are left out of the result
+        ids = [id for id in dict.fromkeys(ids) if id in self.store]
+        topn = min(len(self.store), topn + 1)
+        neighbour_table = self.neighbour_table
+        if topn <= neighbour_k + 1 and neighbour_table is not None:
+            similar = [neighbour_table.neighbours(id, topn) for id in ids]
+        else:
+            similar = self.store.most_similar_many(ids, topn)
+        return {id: similar_indices[1:] for id, similar_indices in zip(ids, similar)}
+
+    def search(self, query, topn=5, mode='exact'):
+        # books whose keywords are closest to a free-text query, embedded and reduced like a keyword
+        query = embedRank.normalizer.normalize(query)
+        topn = min(len(self.store), topn)
+        cached = self.cache.get(('search', query, topn, mode))
+        if cached is not None:
+            return list(cached)
+        vector = normalize_rows(self.pca.transform([self.query_embeddings[query]]))
+        if mode == 'approx':
+            top = self.ann().search(vector, topn)
+        else:
+            top = self.store.top(self.store.scores(vector), topn)
+        similar_indices = self.store.ids[top].tolist()
+        self.cache.put(('search', query, topn, mode), tuple(similar_indices))
+        return similar_indices
+
+    def ann(self):
+        # the index is trained lazily on the first approximate query
+        if self.ann_index is None:
+            self.ann_index = IVFIndex(self.store, nprobe=ann_nprobe)
+        return self.ann_index
+
+    def neighbour_check(self, sample_size=100):
+        # None while the table is being built
+        neighbour_table = self.neighbour_table
+        if neighbour_table is None:
+            return None
+        book_ids = self.store.book_ids()
+        sample = np.random.default_rng(0).choice(book_ids, min(sample_size, len(book_ids)), replace=False)
+        return neighbour_table.check(sample.tolist())
+
+    def ann_report(self, sample_size=100, topn=5):
+        book_ids = self.store.book_ids()
+        sample = np.random.default_rng(0).choice(book_ids, min(sample_size, len(book_ids)), replace=False)
+        return recall_report(self.store, self.ann(), sample.tolist(), topn)
+
     def all_book_id(self):
-        return list(self.book_data.keys())
+        return self.store.book_ids()
 
 
 @app.route('/init_model', methods=['POST'])
@@ -78,6 +342,13 @@ def init_model():
     return 'success'
 
 
+@app.route('/init_status')
+def init_status():
+    # progress, throughput and failed ids of the latest init_model, also while it is running
+    progress = getattr(recommender, 'progress', None)
+    return jsonify(progress.as_dict() if progress is not None else {})
+
+
 @app.route('/insert_book', methods=['POST'])
 def insert_book():
     id = int(request.form.get('id'))
@@ -94,6 +365,38 @@ def delete_book():
     return 'success'
 
 
+@app.route('/insert_books', methods=['POST'])
+def insert_books():
+    # body: [{"id": 1, "summary": "..."}, ...], keywords and errors are reported per id
+    body = request.get_json() or []
+    if not isinstance(body, list) or not all(isinstance(item, dict) for item in body):
+        return make_response('body should be a list of objects', 400)
+
+    books, errors = [], {}
+    for index, item in enumerate(body):
+        try:
+            books.append((int(item['id']), str(item['summary'])))
+        except (KeyError, TypeError, ValueError):
+            errors[str(item.get('id', index))] = 'item should have an id and a summary'
+
+    keywords, failed = recommender.insert_books(books)
+    errors.update({str(id): error for id, error in failed.items()})
+    return jsonify({'keywords': {str(id): words for id, words in keywords.items()}, 'errors': errors})
+
+
+@app.route('/delete_books', methods=['POST'])
+def delete_books():
+    # body: [1, 2, ...], ids that were not in the model are reported as missing
+    try:
+        ids = [int(id) for id in request.get_json() or []]
+    except (TypeError, ValueError):
+        return make_response('body should be a list of ids', 400)
+
+    deleted = recommender.delete_books(ids)
+    missing = set(ids) - set(deleted)
+    return jsonify({'deleted': deleted, 'missing': [id for id in ids if id in missing]})
+
+
 @app.route('/all_book_id')
 def all_book_id():
     return jsonify(recommender.all_book_id())
@@ -101,14 +404,89 @@ def all_book_id():
 
 @app.route('/ask_book', methods=['POST'])
 def ask_book():
-    id = int(request.form.get('id'))
-    return recommender.ask_book(id)
+    try:
+        id = int(request.form.get('id'))
+    except (TypeError, ValueError):
+        return make_response('id should be a number', 400)
+    mode = request.form.get('mode', 'exact')
+    if mode not in ('exact', 'approx'):
+        return make_response('mode should be exact or approx', 400)
+    if id not in recommender.store:
+        return make_response(f'book {id} is not in the model', 404)
+    return recommender.ask_book(id, mode=mode)
+
+
+@app.route('/ask_books', methods=['POST'])
+def ask_books():
+    # body: {"ids": [1, 2, ...], "topn": 5}, returns {"1": [...], "2": [...]}
+    body = request.get_json() or {}
+    try:
+        ids = [int(id) for id in body.get('ids', [])]
+        topn = int(body.get('topn', 5))
+    except (TypeError, ValueError):
+        return make_response('ids should be a list of ids and topn a number', 400)
+    return jsonify({str(id): similar for id, similar in recommender.ask_books(ids, topn).items()})
+
+
+@app.route('/search', methods=['POST'])
+def search():
+    # body: {"query": "...", "topn": 5, "mode": "exact"}, returns the ids of the closest books
+    body = request.get_json() or {}
+    query = body.get('query')
+    mode = body.get('mode', 'exact')
+    try:
+        topn = int(body.get('topn', 5))
+    except (TypeError, ValueError):
+        return make_response('topn should be a number', 400)
+    if not isinstance(query, str) or not query.strip():
+        return make_response('query should be a non-empty string', 400)
+    if mode not in ('exact', 'approx'):
+        return make_response('mode should be exact or approx', 400)
+    return jsonify(recommender.search(query, topn, mode))
+
+
+@app.route('/query_cache_stats')
+def query_cache_stats():
+    return jsonify(recommender.query_embeddings.stats())
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(recommender.cache.stats())
+
+
+@app.route('/embedding_cache_stats')
+def embedding_cache_stats():
+    return jsonify(recommender.embedding_model.stats())
+
+
+@app.route('/save_snapshot', methods=['POST'])
+def save_snapshot():
+    return jsonify(recommender.save_snapshot())
+
+
+@app.route('/neighbour_check')
+def neighbour_check():
+    # ids whose precomputed neighbours disagree with the brute-force scan
+    sample_size = int(request.args.get('sample_size', 100))
+    mismatches = recommender.neighbour_check(sample_size)
+    if mismatches is None:
+        return make_response('the neighbour table is still being built', 503)
+    return jsonify(mismatches)
+
+
+@app.route('/ann_report')
+def ann_report():
+    sample_size = int(request.args.get('sample_size', 100))
+    return jsonify(recommender.ann_report(sample_size))
 
 recommender = SingletonRecommender()
 
 if __name__ == '__main__':
-    #for locust...
-    recommender.init_model(sample_dict, sent2vec_path, posTagger_path)
+    logging.basicConfig(level=logging.INFO)
+    if not recommender.warm_start():
+        #for locust...
+        recommender.init_model(sample_dict, sent2vec_path, posTagger_path)
     print(recommender.all_book_id())
     
     # recommender.init_model({})
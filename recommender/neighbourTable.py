@@ -0,0 +1,111 @@
+import numpy as np
+
+
+class NeighbourTable:
+    # The k + 1 most similar books of every book, in the order the exact scan
+    # ranks them (the book itself included). Rows are aligned with the store
+    # positions; an insert only scores the new books against the catalog and
+    # patches the rows they enter, a delete recomputes the rows it leaves.
+
+    def __init__(self, store, k=10, chunk=256):
+        self.store = store
+        self.size = k + 1
+        self.chunk = chunk
+        self.build()
+
+    @classmethod
+    def from_arrays(cls, store, ids, scores, chunk=256):
+        # adopts rows saved for the positions of store as they are, without a build
+        table = cls.__new__(cls)
+        table.store, table.size, table.chunk = store, ids.shape[1], chunk
+        table.ids, table.scores = ids, scores
+        return table
+
+    def build(self):
+        self.ids = np.full((self.store.n_books, self.size), -1, dtype=np.int64)
+        self.scores = np.full((self.store.n_books, self.size), -np.inf, dtype=np.float32)
+        self._recompute(self.store.book_ids())
+
+    def _grow(self):
+        missing = self.store.n_books - len(self.ids)
+        if missing > 0:
+            self.ids = np.concatenate((self.ids, np.full((missing, self.size), -1, dtype=np.int64)))
+            self.scores = np.concatenate((self.scores, np.full((missing, self.size), -np.inf, dtype=np.float32)))
+
+    def _recompute(self, book_ids):
+        for start in range(0, len(book_ids), self.chunk):
+            chunk = book_ids[start:start + self.chunk]
+            self._set_rows(chunk, self.store.scores_many(chunk))
+
+    def _set_rows(self, book_ids, scores):
+        for column, book_id in enumerate(book_ids):
+            top = self.store.top(scores[:, column], self.size)
+            position = self.store.positions[book_id]
+            self.ids[position] = -1
+            self.scores[position] = -np.inf
+            self.ids[position, :len(top)] = self.store.ids[top]
+            self.scores[position, :len(top)] = scores[top, column]
+
+    def insert(self, book_ids):
+        # call after the books were added to the store
+        self._grow()
+        book_ids = sorted((book_id for book_id in book_ids if book_id in self.store), key=self.store.positions.get)
+        if not book_ids:
+            return
+        first = self.store.positions[book_ids[0]]
+        scores = self.store.scores_many(book_ids)
+        self._set_rows(book_ids, scores)
+
+        old = np.flatnonzero(self.store.alive[:first])
+        for column, book_id in enumerate(book_ids):
+            self._patch(old, scores[old, column], book_id)
+
+    def _patch(self, rows, score, book_id):
+        # a new book is the latest position, so it goes after every entry it ties with
+        current = self.scores[rows]
+        enters = (score > current[:, -1]) & ~(self.ids[rows] == book_id).any(axis=1)
+        rows, score, current = rows[enters], score[enters], current[enters]
+        index = (current >= score[:, None]).sum(axis=1)[:, None]
+        columns = np.arange(self.size)[None, :]
+        shifted = np.roll(current, 1, axis=1)
+        self.scores[rows] = np.where(columns < index, current, np.where(columns == index, score[:, None], shifted))
+        current_ids = self.ids[rows]
+        self.ids[rows] = np.where(columns < index, current_ids, np.where(columns == index, book_id, np.roll(current_ids, 1, axis=1)))
+
+    def delete(self, book_ids):
+        # call after the books were deleted from the store
+        if not book_ids:
+            return
+        self._grow()
+        alive = self.store.alive[:len(self.ids)]
+        self.ids[~alive] = -1
+        self.scores[~alive] = -np.inf
+        affected = alive & np.isin(self.ids, book_ids).any(axis=1)
+        self._recompute(self.store.ids[np.flatnonzero(affected)].tolist())
+
+    def rebind(self, store):
+        # move rows built on a compacted copy of store to the positions their books have in store now;
+        # books inserted since have no row yet and rows that name deleted books are stale, so follow with
+        # the same delete() and insert() calls that were made on store in the meantime
+        ids = np.full((store.n_books, self.size), -1, dtype=np.int64)
+        scores = np.full((store.n_books, self.size), -np.inf, dtype=np.float32)
+        positions = np.array([store.positions.get(int(book_id), -1) for book_id in self.store.ids[:self.store.n_books]],
+                             dtype=np.int64)
+        found = positions >= 0
+        ids[positions[found]] = self.ids[:len(positions)][found]
+        scores[positions[found]] = self.scores[:len(positions)][found]
+        self.store, self.ids, self.scores = store, ids, scores
+
+    def compact(self, kept):
+        # follow a VectorStore.compact(), whose kept positions renumber every row
+        self.ids = self.ids[kept]
+        self.scores = self.scores[kept]
+
+    def neighbours(self, book_id, k):
+        row = self.ids[self.store.positions[book_id]]
+        return row[row >= 0][:k].tolist()
+
+    def check(self, book_ids):
+        # ids whose row disagrees with the brute-force scan
+        return [book_id for book_id in book_ids
+                if self.neighbours(book_id, self.size) != self.store.most_similar(book_id, self.size)]
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    # Bounded LRU cache of ask_book results with a time to live. Entries are
+    # tagged with the catalog version they were computed for: an insert bumps
+    # the version, which turns every older entry into a miss, while a delete
+    # only drops the entries that mention the deleted books.
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                version, expires, value = entry
+                if version == self.version and expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.version, time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self):
+        with self.lock:
+            self.version += 1
+
+    def invalidate(self, book_ids):
+        # the results that neither ask about nor contain a deleted book stay valid
+        book_ids = set(book_ids)
+        with self.lock:
+            stale = [key for key, (_, _, value) in self.entries.items()
+                     if key[0] in book_ids or not book_ids.isdisjoint(value)]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import numpy as np
+
+from vectorStore import VectorStore
+from neighbourTable import NeighbourTable
+
+
+SNAPSHOT_NAME = re.compile(r'snapshot-\d{6}$')
+
+
+def fingerprint(summary):
+    # stable across processes, unlike hash(), so init_model can tell an unchanged summary from a snapshot
+    return hashlib.sha1(summary.encode('utf-8')).hexdigest()
+
+
+def file_identity(path):
+    # name, size and mtime of a model file, enough to notice it was replaced without hashing gigabytes
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {'name': os.path.basename(path)}
+    return {'name': os.path.basename(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+class Snapshots:
+    # A snapshot directory holds the compacted store as .npy files plus the
+    # keywords and the summary fingerprint of every book, next to the identity
+    # of the models that produced the vectors and the neighbour table once it
+    # has been built. Inserts and deletes made after it are appended
+    # to its journal, so a restart loads the arrays memory-mapped and only
+    # replays the journal instead of re-running embedRank over the catalog.
+
+    def __init__(self, directory, keep=2):
+        self.directory = directory
+        self.keep = keep
+        self.path = None
+        self.pending = 0
+
+    def snapshots(self):
+        if not os.path.isdir(self.directory):
+            return []
+        # a .tmp directory left by a crashed save is not a snapshot
+        return sorted(name for name in os.listdir(self.directory) if SNAPSHOT_NAME.match(name))
+
+    def latest(self):
+        names = self.snapshots()
+        return os.path.join(self.directory, names[-1]) if names else None
+
+    def save(self, store, keywords, fingerprints=None, models=None, neighbours=None):
+        names = self.snapshots()
+        sequence = int(names[-1].split('-')[1]) + 1 if names else 1
+        path = os.path.join(self.directory, f'snapshot-{sequence:06d}')
+        tmp_path = path + '.tmp'
+        os.makedirs(self.directory, exist_ok=True)
+        # what a crashed save left behind
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        alive_rows = store.alive_rows()
+        lengths = store.lengths()[store.alive[:store.n_books]]
+        ids = store.ids[:store.n_books][store.alive[:store.n_books]]
+        np.save(os.path.join(tmp_path, 'vectors.npy'), store.matrix[:store.n_rows][alive_rows])
+        np.save(os.path.join(tmp_path, 'ids.npy'), ids)
+        np.save(os.path.join(tmp_path, 'offsets.npy'), np.cumsum(lengths) - lengths)
+        if neighbours is not None:
+            np.save(os.path.join(tmp_path, 'neighbour_ids.npy'), neighbours.ids[:store.n_books][store.alive[:store.n_books]])
+            np.save(os.path.join(tmp_path, 'neighbour_scores.npy'), neighbours.scores[:store.n_books][store.alive[:store.n_books]])
+        with open(os.path.join(tmp_path, 'keywords.json'), 'w', encoding='utf-8') as f:
+            json.dump({str(book_id): keywords.get(int(book_id), []) for book_id in ids}, f, ensure_ascii=False)
+        fingerprints = fingerprints or {}
+        with open(os.path.join(tmp_path, 'fingerprints.json'), 'w', encoding='utf-8') as f:
+            json.dump({str(book_id): fingerprints[int(book_id)] for book_id in ids if int(book_id) in fingerprints}, f)
+        with open(os.path.join(tmp_path, 'models.json'), 'w', encoding='utf-8') as f:
+            json.dump(models or {}, f)
+        open(os.path.join(tmp_path, 'journal.jsonl'), 'w').close()
+        # the rename makes a half-written snapshot invisible to latest()
+        os.replace(tmp_path, path)
+
+        self.path = path
+        self.pending = 0
+        for name in self.snapshots()[:-self.keep]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        return path
+
+    def load(self, models=None):
+        # a snapshot written with other models than the given ones is not loaded, its vectors do not match them
+        path = self.latest()
+        if path is None:
+            return None
+        if models is not None:
+            with open(os.path.join(path, 'models.json'), encoding='utf-8') as f:
+                if json.load(f) != models:
+                    return None
+        store = VectorStore.from_arrays(
+            np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r'),
+        )
+        with open(os.path.join(path, 'keywords.json'), encoding='utf-8') as f:
+            keywords = {int(book_id): words for book_id, words in json.load(f).items()}
+        with open(os.path.join(path, 'fingerprints.json'), encoding='utf-8') as f:
+            fingerprints = {int(book_id): value for book_id, value in json.load(f).items()}
+        neighbours = None
+        if os.path.exists(os.path.join(path, 'neighbour_ids.npy')):
+            neighbours = NeighbourTable.from_arrays(store, np.load(os.path.join(path, 'neighbour_ids.npy')),
+                                                    np.load(os.path.join(path, 'neighbour_scores.npy')))
+
+        self.path = path
+        self.pending = 0
+        for entry in self._journal(path):
+            if entry['op'] == 'insert':
+                replaced = [entry['id']] if entry['id'] in store else []
+                store.insert(entry['id'], np.asarray(entry['vectors'], dtype=np.float32))
+                if neighbours is not None:
+                    neighbours.delete(replaced)
+                    neighbours.insert([entry['id']])
+                keywords[entry['id']] = entry['keywords']
+                fingerprints.pop(entry['id'], None)
+                if entry['fingerprint'] is not None:
+                    fingerprints[entry['id']] = entry['fingerprint']
+            else:
+                if store.delete(entry['id']) and neighbours is not None:
+                    neighbours.delete([entry['id']])
+                keywords.pop(entry['id'], None)
+                fingerprints.pop(entry['id'], None)
+            self.pending += 1
+        return store, keywords, fingerprints, neighbours
+
+    def _journal(self, path):
+        journal = os.path.join(path, 'journal.jsonl')
+        with open(journal, 'rb') as f:
+            lines = f.readlines()
+        good = 0
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash can leave the last line half written, cut it off so new entries start clean
+                with open(journal, 'r+b') as f:
+                    f.truncate(good)
+                return
+            good += len(line)
+            yield entry
+
+    def _append(self, entry):
+        if self.path is None:
+            return
+        with open(os.path.join(self.path, 'journal.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.pending += 1
+
+    def log_insert(self, book_id, vectors, keywords, fingerprint=None):
+        self._append({'op': 'insert', 'id': int(book_id), 'vectors': np.asarray(vectors).tolist(), 'keywords': keywords,
+                      'fingerprint': fingerprint})
+
+    def log_delete(self, book_id):
+        self._append({'op': 'delete', 'id': int(book_id)})
@@ -14,9 +14,15 @@ small_sample_text = 'در جنگل ایران گونه‌های جانوری ز
 small_sample_text1 = 'آمازون شامل ببرهای وحشی زیادی است.'
 test_recommender = SingletonRecommender()
 sample_dict = {5:small_sample_text, 6:big_sample_text, 7:small_sample_text1}
-test_recommender.init_model(book_data=sample_dict, posTagger_path=tagger_path, sent2vec_path=embedding_path)
 recommender = test_recommender
 
+@pytest.fixture(scope='module', autouse=True)
+def model(tmp_path_factory):
+    # the snapshots of the tests stay out of the default snapshot_dir
+    test_recommender.init_model(book_data=sample_dict, posTagger_path=tagger_path, sent2vec_path=embedding_path,
+                                snapshot_dir=str(tmp_path_factory.mktemp('snapshots')))
+    test_recommender.wait_for_neighbours()
+
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
@@ -38,6 +44,13 @@ def test_ask_book_when_input_id_is_correct_should_return_2_id():
     assert len(output) == 2, f'the number of the ids should be 2 but it is {len(output)}.'
     assert type(output[0]) ==int, f'type of each element should be int and not a {type(output[0])}'
 
+def test_ask_book_should_match_brute_force_cosine_similarity():
+    from sklearn.metrics.pairwise import cosine_similarity
+    vectors = {i: test_recommender.store.vectors(i) for i in test_recommender.all_book_id()}
+    sim_dic = {i: np.max(cosine_similarity(vectors[6], vectors[i])) for i in vectors}
+    expected = sorted(sim_dic, key=sim_dic.get, reverse=True)[1:]
+    assert test_recommender.ask_book(id=6) == expected, f'ask_book should rank books like the brute-force scan'
+
 def test_delete_book_when_input_id_is_correct_should_not_exist_in_all_book():
     test_recommender.delete_book(id=6)
     output = test_recommender.all_book_id()
@@ -91,6 +104,263 @@ def test_Flask_ask_book_when_input_id_is_correct_should_return_2_id(client):
     assert len(output) == 2, f'the number of the ids should be 2 but it is {len(output)}.'
     assert type(output[0]) ==int, f'type of each element should be int and not a {type(output[0])}'
 
+def test_Flask_ask_book_when_mode_is_approx_should_return_2_id(client):
+    book_id = {'id': 6, 'mode': 'approx'}
+    response = client.post('/ask_book', data=book_id)
+    output = json.loads(response.data)
+    assert response.status_code == 200
+    assert len(output) == 2, f'the number of the ids should be 2 but it is {len(output)}.'
+
+def test_Flask_ask_book_when_mode_is_invalid_should_return_400(client):
+    book_id = {'id': 6, 'mode': 'fast'}
+    response = client.post('/ask_book', data=book_id)
+    assert response.status_code == 400
+
+def test_Flask_ask_book_when_id_is_not_in_the_model_should_return_404(client):
+    response = client.post('/ask_book', data={'id': 999})
+    assert response.status_code == 404, f'an unknown id should be 404 but it is {response.status_code}'
+
+def test_ann_report_when_all_buckets_are_probed_should_have_full_recall():
+    report = recall_report(test_recommender.store, test_recommender.ann(), test_recommender.all_book_id(), nprobes=(len(test_recommender.ann().centroids),))
+    assert report[0]['recall'] == 1.0, f'probing every bucket is an exact scan but recall is {report[0]["recall"]}'
+
+
+def test_snapshot_load_should_restore_books_and_replay_journal(tmp_path):
+    snapshots = Snapshots(str(tmp_path))
+    snapshots.save(test_recommender.store, test_recommender.keywords)
+    snapshots.log_delete(5)
+    store, keywords, fingerprints, neighbours = Snapshots(str(tmp_path)).load()
+    assert 5 not in store.book_ids(), f'the 5th id was deleted after the snapshot but it is available now'
+    assert keywords[6] == test_recommender.keywords[6], f'the keywords of the 6th id should survive the snapshot'
+    assert np.allclose(store.vectors(6), test_recommender.store.vectors(6)), f'the vectors of the 6th id should survive the snapshot'
+
+def test_snapshot_save_when_a_crashed_save_left_a_tmp_directory_should_ignore_it(tmp_path):
+    snapshots = Snapshots(str(tmp_path))
+    snapshots.save(test_recommender.store, test_recommender.keywords)
+    os.makedirs(os.path.join(str(tmp_path), 'snapshot-000002.tmp'))
+    assert snapshots.latest().endswith('snapshot-000001'), f'a half-written snapshot should not be loaded'
+    path = snapshots.save(test_recommender.store, test_recommender.keywords)
+    assert path.endswith('snapshot-000002')
+    assert not os.path.exists(path + '.tmp'), f'the leftover of the crashed save should be removed'
+
+def test_init_model_when_summaries_are_unchanged_should_reuse_the_snapshot(tmp_path):
+    # a second recommender next to the singleton the other tests use
+    other = object.__new__(SingletonRecommender)
+    other.init_model(sample_dict, sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path))
+    edited = {**sample_dict, 7: small_sample_text1 + ' ' + small_sample_text}
+    other.init_model(edited, sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path))
+    assert other.progress.reused == 2, f'the books 5 and 6 did not change and should be taken from the snapshot'
+    assert sorted(other.all_book_id()) == [5, 6, 7]
+    assert np.allclose(other.store.vectors(6), test_recommender.store.vectors(6)), f'a reused book should keep its vectors'
+
+def test_init_model_when_the_pca_model_changed_should_not_reuse_the_snapshot(tmp_path):
+    other = object.__new__(SingletonRecommender)
+    other.init_model(sample_dict, sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path))
+    other.wait_for_neighbours()
+    # as if the snapshot had been written with another PCA model
+    with open(os.path.join(other.snapshots.path, 'models.json'), 'w') as f:
+        json.dump(dict(other.models, pca={'name': 'other_pca.model'}), f)
+    assert not other.warm_start(sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path)), \
+        f'the snapshot of another PCA model should not be warm started'
+    other.init_model(sample_dict, sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path))
+    assert other.progress.reused == 0, f'the vectors of another PCA model should be extracted again'
+
+def test_Flask_init_status_should_report_3_books_done(client):
+    response = client.get('/init_status')
+    status = json.loads(response.data)
+    assert response.status_code == 200
+    assert status['done'] == 3, f'init_model got 3 books but it reports {status["done"]} done'
+    assert status['failed'] == {}, f'no book should fail but {status["failed"]} failed'
+
+def test_embedRankBatch_should_return_the_same_keywords_as_embedRank():
+    texts = [big_sample_text, small_sample_text, small_sample_text1]
+    batch = embedRank.embedRankBatch(texts, [5, 4, 4], test_recommender.embedding_model, test_recommender.posTagger)
+    for text, keywords, keyword_num in zip(texts, batch, [5, 4, 4]):
+        expected = embedRank.embedRank(text, keyword_num, test_recommender.embedding_model, test_recommender.posTagger)
+        assert sorted(keywords) == sorted(expected), f'the batched keywords should match embedRank'
+
+def test_embedRankBatch_when_texts_have_many_candidates_should_run_their_own_mmr():
+    texts = [big_sample_text, small_sample_text, small_sample_text1]
+    batched = embedRank.embedRankBatch(texts, [5, 4, 4], test_recommender.embedding_model, test_recommender.posTagger)
+    with patch('embedRank.embedRankExtractionBatch') as extraction_batch:
+        alone = embedRank.embedRankBatch(texts, [5, 4, 4], test_recommender.embedding_model, test_recommender.posTagger,
+                                         batch_max_candidates=0)
+    assert not extraction_batch.called, f'texts over batch_max_candidates should not be padded into a batch'
+    assert alone == batched, f'per text MMR should select the same keywords as the padded batch'
+
+def test_extract_batch_when_one_summary_breaks_the_batch_should_fail_only_that_book():
+    embedRankBatch = embedRank.embedRankBatch
+    def failing_batch(summaries, *args, **kwargs):
+        if 'bad summary' in summaries:
+            raise ValueError('bad summary')
+        return embedRankBatch(summaries, *args, **kwargs)
+    with patch('embedRank.embedRankBatch', side_effect=failing_batch):
+        results = extract_batch([(1, small_sample_text), (2, 'bad summary')], test_recommender.embedding_model, test_recommender.posTagger)
+    assert results[0][0] == 1 and results[0][3] is None, f'the good book should get its keywords'
+    assert results[1][0] == 2 and results[1][3] is not None, f'only the bad book should be reported as failed'
+
+def test_extract_batch_when_summary_is_longer_than_stream_summary_words_should_stream_it():
+    limit = len(small_sample_text.split())
+    items = [(1, big_sample_text), (2, small_sample_text)]
+    with patch('embedRank.embedRankStream', wraps=embedRank.embedRankStream) as stream, \
+            patch('embedRank.embedRankBatch', wraps=embedRank.embedRankBatch) as batch:
+        results = extract_batch(items, test_recommender.embedding_model, test_recommender.posTagger, stream_summary_words=limit)
+    assert [args[0] for args, _ in stream.call_args_list] == [big_sample_text], f'only the long summary should be streamed'
+    assert batch.call_args[0][0] == [small_sample_text], f'the short summary should stay in the batch'
+    assert [result[0] for result in results] == [1, 2], f'results should keep the order of the items'
+    assert all(result[3] is None for result in results), f'no book should fail'
+
+def test_Flask_insert_books_when_input_2_books_should_return_keywords_per_id(client):
+    books = [{'id': 1, 'summary': big_sample_text}, {'id': 2, 'summary': small_sample_text}, {'summary': small_sample_text1}]
+    response = client.post('/insert_books', json=books)
+    output = json.loads(response.data)
+    assert response.status_code == 200
+    assert len(output['keywords']['1']) == 10, f'the number of the keywords should be 10 but it is {len(output["keywords"]["1"])}.'
+    assert len(output['keywords']['2']) == 4, f'the number of the keywords should be 4 but it is {len(output["keywords"]["2"])}.'
+    assert len(output['errors']) == 1, f'the item without id should be reported as an error'
+    test_recommender.delete_books([1, 2])
+
+def test_Flask_insert_books_when_body_is_not_a_list_of_objects_should_return_400(client):
+    assert client.post('/insert_books', json=5).status_code == 400
+    assert client.post('/insert_books', json=[1, 2]).status_code == 400
+
+def test_Flask_delete_books_should_report_deleted_and_missing_ids(client):
+    test_recommender.insert_books([(1, small_sample_text), (2, small_sample_text1)])
+    response = client.post('/delete_books', json=[1, 2, 999])
+    output = json.loads(response.data)
+    assert response.status_code == 200
+    assert output == {'deleted': [1, 2], 'missing': [999]}
+    assert 1 not in test_recommender.all_book_id(), f'the 1st id should be deleted but it is available now'
+
+def test_Flask_ask_books_should_return_the_same_ids_as_ask_book(client):
+    response = client.post('/ask_books', json={'ids': [5, 6, 7], 'topn': 5})
+    output = json.loads(response.data)
+    assert response.status_code == 200
+    for id in [5, 6, 7]:
+        assert output[str(id)] == test_recommender.ask_book(id), f'ask_books should agree with ask_book for the {id}th id'
+
+def test_neighbour_table_after_insert_and_delete_should_match_brute_force():
+    test_recommender.insert_book(1, big_sample_text)
+    test_recommender.insert_book(2, small_sample_text)
+    test_recommender.delete_book(id=1)
+    mismatches = test_recommender.neighbour_check()
+    test_recommender.delete_book(id=2)
+    assert mismatches == [], f'the neighbour table of {mismatches} should match the brute-force scan'
+
+def test_neighbour_table_when_a_book_is_inserted_during_the_build_should_include_it():
+    def build_and_insert(store, k):
+        table = NeighbourTable(store, k)
+        test_recommender.insert_book(1, small_sample_text)
+        return table
+    with patch('main.NeighbourTable', side_effect=build_and_insert):
+        test_recommender._reset_indexes()
+        assert test_recommender.wait_for_neighbours(), f'the table should be ready once the build thread is done'
+    mismatches = test_recommender.neighbour_check()
+    test_recommender.delete_book(id=1)
+    assert mismatches == [], f'the book inserted during the build should be in the table, but {mismatches} mismatch'
+
+def test_ask_book_while_the_neighbour_table_is_built_should_scan_the_store():
+    neighbour_table = test_recommender.neighbour_table
+    test_recommender.neighbour_table = None
+    test_recommender.cache.bump()
+    output = test_recommender.ask_book(id=6)
+    test_recommender.neighbour_table = neighbour_table
+    assert output == test_recommender.store.most_similar(6, 3)[1:], f'ask_book should fall back to the exact scan'
+
+def test_warm_start_should_take_the_neighbour_table_from_the_snapshot(tmp_path):
+    other = object.__new__(SingletonRecommender)
+    other.init_model(sample_dict, sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path))
+    other.wait_for_neighbours()
+    # journaled after the snapshot, replayed on the saved table
+    other.insert_book(1, big_sample_text)
+    other.delete_book(id=5)
+    assert other.warm_start(sent2vec_path=embedding_path, posTagger_path=tagger_path, snapshot_dir=str(tmp_path))
+    assert other.neighbour_thread is None, f'the table of the snapshot should be used instead of a new build'
+    assert other.neighbour_check() == [], f'the saved table with the journal replayed should match the brute-force scan'
+
+def test_Flask_cache_stats_when_ask_book_repeats_should_count_hits(client):
+    hits = test_recommender.cache.stats()['hits']
+    test_recommender.ask_book(id=5)
+    test_recommender.ask_book(id=5)
+    response = client.get('/cache_stats')
+    stats = json.loads(response.data)
+    assert response.status_code == 200
+    assert stats['hits'] >= hits + 1, f'the repeated ask_book should be a cache hit'
+
+def test_ask_book_after_insert_book_should_not_return_stale_result():
+    before = test_recommender.ask_book(id=6)
+    test_recommender.insert_book(1, big_sample_text)
+    after = test_recommender.ask_book(id=6)
+    test_recommender.delete_book(id=1)
+    assert 1 in after, f'the inserted copy of the 6th summary should be suggested but the result is {after}'
+    assert test_recommender.ask_book(id=6) == before, f'after deleting it the result should be the old one'
+
+def test_Flask_embedding_cache_stats_when_insert_book_repeats_should_count_hits(client):
+    test_recommender.insert_book(1, small_sample_text)
+    hits = test_recommender.embedding_model.stats()['hits']
+    test_recommender.insert_book(1, small_sample_text)
+    response = client.get('/embedding_cache_stats')
+    stats = json.loads(response.data)
+    test_recommender.delete_book(id=1)
+    assert response.status_code == 200
+    assert stats['hits'] > hits, f'the keywords of the repeated summary should be embedded from the cache'
+
+def test_embedding_cache_load_when_saved_for_another_model_should_skip_the_file(tmp_path):
+    path = os.path.join(str(tmp_path), 'embeddings.npz')
+    assert os.path.exists(os.path.join(test_recommender.snapshots.directory, 'embeddings.npz')), \
+        f'the cache should be saved in the snapshot directory in use'
+    test_recommender.embedding_model.save(path, {'name': 'fake.model'})
+    cache = EmbeddingCache(test_recommender.embedding_model.model)
+    assert cache.load(path, test_recommender.models['sent2vec']) == 0, f'phrases of another model should not be loaded'
+    assert cache.load(path, {'name': 'fake.model'}, dimension=7) == 0, f'vectors of another dimension should not be loaded'
+    assert cache.load(path, {'name': 'fake.model'}) == test_recommender.embedding_model.stats()['size']
+
+def test_text2vec_should_not_cache_the_joined_candidates():
+    candidates = embedRank.extractCandidates(embedRank.posTagger(small_sample_text, posTaggerModel=test_recommender.posTagger))
+    embedRank.text2vec(candidates, sent2vecModel=test_recommender.embedding_model)
+    assert " ".join(candidates) not in test_recommender.embedding_model.entries, f'the text vector should bypass the phrase cache'
+    assert all(candidate in test_recommender.embedding_model.entries for candidate in candidates)
+
+def test_load_models_when_called_again_should_reuse_the_loaded_models():
+    embedding_model, posTagger = test_recommender.embedding_model.model, test_recommender.posTagger
+    test_recommender.load_models(sent2vec_path=embedding_path, posTagger_path=tagger_path)
+    assert test_recommender.embedding_model.model is embedding_model, f'the sent2vec model should be loaded once per process'
+    assert test_recommender.posTagger is posTagger, f'the pos tagger should be loaded once per process'
+
+def test_embedRankExtraction_should_select_the_same_keywords_as_the_legacy_selection():
+    from benchmark_mmr import legacyEmbedRankExtraction
+    docs = []
+    for text in [big_sample_text, small_sample_text, small_sample_text1]:
+        candidates = embedRank.extractCandidates(embedRank.posTagger(text, posTaggerModel=test_recommender.posTagger))
+        candidates_vector, text_vector = embedRank.text2vec(candidates, sent2vecModel=test_recommender.embedding_model)
+        docs.append((candidates,) + embedRank.vectorSimilarity(candidates_vector, text_vector))
+    expected = [legacyEmbedRankExtraction(*doc, 10) for doc in docs]
+    assert [embedRank.embedRankExtraction(*doc, 10) for doc in docs] == expected, f'the vectorised MMR should select the same keywords'
+    assert embedRank.embedRankExtractionBatch(*zip(*docs), [10] * len(docs)) == expected, f'the batched MMR should select the same keywords'
+
+def test_embedRankStream_when_input_long_text_should_return_keywords_from_at_most_max_candidates():
+    long_text = ' '.join([big_sample_text] * 50)
+    output = embedRank.embedRankStream(long_text, 10, test_recommender.embedding_model, test_recommender.posTagger, max_candidates=8, chunk_sentences=2)
+    assert len(output) == 8, f'the number of the keywords should be capped at 8 but it is {len(output)}.'
+    assert all(keyword in embedRank.extractCandidates(embedRank.posTagger(big_sample_text, posTaggerModel=test_recommender.posTagger)) for keyword in output)
+
+def test_search_when_topn_is_larger_than_the_catalog_should_hit_the_cache():
+    test_recommender.search(small_sample_text1, topn=100)
+    hits = test_recommender.cache.stats()['hits']
+    test_recommender.search(small_sample_text1, topn=100)
+    assert test_recommender.cache.stats()['hits'] == hits + 1, f'the second search should be answered from the cache'
+
+def test_Flask_search_when_query_is_the_summary_of_a_book_should_return_that_book_first(client):
+    # a summary no other book has, so book 1 has no tie to lose
+    summary = 'کتابخانه ملی تهران نسخه‌های خطی قدیمی زیادی نگهداری می‌کند.'
+    test_recommender.insert_book(1, summary)
+    response = client.post('/search', json={'query': summary, 'topn': 3})
+    bad_response = client.post('/search', json={'query': '', 'topn': 3})
+    test_recommender.delete_book(id=1)
+    assert response.status_code == 200
+    assert json.loads(response.data)[0] == 1, f'the book of the summary should be the closest one'
+    assert bad_response.status_code == 400
+
 
 
 
@@ -102,4 +372,4 @@ def test_Flask_ask_book_when_input_id_is_correct_should_return_2_id(client):
 #     with app.test_request_context():
 #         routes = [str(rule) for rule in app.url_map.iter_rules()]
 #         print(routes)
-#     app.run(port=5000)
\ No newline at end of file
+#     app.run(port=5000)
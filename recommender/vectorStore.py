@@ -0,0 +1,191 @@
+import numpy as np
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # zero vectors stay zero, which gives them a cosine of 0 like sklearn does
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _grow(array, size):
+    if size <= len(array):
+        return array
+    grown = np.empty((max(size, 2 * len(array), 16),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class VectorStore:
+    # All keyword vectors live in one contiguous float32 matrix whose rows are
+    # L2-normalized, so a dot product is a cosine similarity. Books are kept in
+    # insertion order: the book at position p owns rows offsets[p]:offsets[p + 1].
+    # Deleted books are only marked dead and dropped on compact().
+
+    def __init__(self):
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        self.n_rows = 0
+        self.n_books = 0
+        self.dead_rows = 0
+        self.positions = {}
+
+    @classmethod
+    def from_arrays(cls, matrix, ids, offsets):
+        # adopts already normalized arrays as they are, so memory-mapped files are not copied
+        store = cls()
+        store.matrix, store.ids, store.offsets = matrix, ids, offsets
+        store.alive = np.ones(len(ids), dtype=bool)
+        store.n_rows, store.n_books = len(matrix), len(ids)
+        store.positions = {int(book_id): position for position, book_id in enumerate(ids)}
+        return store
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, book_id):
+        return book_id in self.positions
+
+    def _reserve(self, n_rows, n_books, dim):
+        if self.matrix.shape[1] != dim:
+            if self.n_rows:
+                raise ValueError(f'vector dimension should be {self.matrix.shape[1]} but it is {dim}')
+            self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.matrix = _grow(self.matrix, self.n_rows + n_rows)
+        self.ids = _grow(self.ids, self.n_books + n_books)
+        self.offsets = _grow(self.offsets, self.n_books + n_books)
+        self.alive = _grow(self.alive, self.n_books + n_books)
+
+    def insert(self, book_id, vectors):
+        self.insert_many([book_id], vectors, [len(vectors)])
+
+    def insert_many(self, book_ids, vectors, lengths):
+        vectors = normalize_rows(vectors)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if len(lengths) != len(book_ids) or lengths.sum() != len(vectors):
+            raise ValueError('lengths should give the number of vectors of every book')
+        if len(lengths) and lengths.min() < 1:
+            raise ValueError('every book needs at least one keyword vector')
+        for book_id in book_ids:
+            self.delete(book_id)
+
+        self._reserve(len(vectors), len(book_ids), vectors.shape[1])
+        start, stop = self.n_books, self.n_books + len(book_ids)
+        self.matrix[self.n_rows:self.n_rows + len(vectors)] = vectors
+        self.ids[start:stop] = book_ids
+        self.offsets[start:stop] = self.n_rows + np.cumsum(lengths) - lengths
+        self.alive[start:stop] = True
+        for position, book_id in enumerate(book_ids, start):
+            self.positions[int(book_id)] = position
+        self.n_rows += len(vectors)
+        self.n_books = stop
+
+    def delete(self, book_id):
+        position = self.positions.pop(book_id, None)
+        if position is None:
+            return False
+        self.alive[position] = False
+        rows = self._rows(position)
+        self.dead_rows += rows.stop - rows.start
+        return True
+
+    def _rows(self, position):
+        stop = self.offsets[position + 1] if position + 1 < self.n_books else self.n_rows
+        return slice(self.offsets[position], stop)
+
+    def vectors(self, book_id):
+        return self.matrix[self._rows(self.positions[book_id])]
+
+    def book_ids(self):
+        return self.ids[:self.n_books][self.alive[:self.n_books]].tolist()
+
+    def needs_compaction(self):
+        return self.dead_rows > max(self.n_rows // 2, 1024)
+
+    def owners(self, rows):
+        return np.searchsorted(self.offsets[:self.n_books], rows, side='right') - 1
+
+    def lengths(self):
+        return np.diff(np.append(self.offsets[:self.n_books], self.n_rows))
+
+    def alive_rows(self):
+        return np.repeat(self.alive[:self.n_books], self.lengths())
+
+    def compact(self):
+        # returns the old positions of the surviving books and a mask of the surviving rows
+        kept = np.flatnonzero(self.alive[:self.n_books])
+        lengths = self.lengths()
+        kept_rows = np.repeat(self.alive[:self.n_books], lengths)
+        if len(kept) == self.n_books:
+            return kept, kept_rows
+        self.matrix = self.matrix[:self.n_rows][kept_rows]
+        lengths = lengths[kept]
+        self.ids = self.ids[kept]
+        self.offsets = np.cumsum(lengths) - lengths
+        self.alive = np.ones(len(kept), dtype=bool)
+        self.n_rows, self.n_books, self.dead_rows = len(self.matrix), len(kept), 0
+        self.positions = {int(book_id): position for position, book_id in enumerate(self.ids)}
+        return kept, kept_rows
+
+    def compacted_copy(self):
+        # the living books in a new store that later inserts, deletes and compactions of this one do not touch
+        alive = self.alive[:self.n_books]
+        lengths = self.lengths()[alive]
+        return VectorStore.from_arrays(self.matrix[:self.n_rows][self.alive_rows()], self.ids[:self.n_books][alive],
+                                       np.cumsum(lengths) - lengths)
+
+    def scores(self, query):
+        # best cosine between any query row and any row of each book, -inf for dead books
+        if self.n_books == 0:
+            return np.empty(0, dtype=np.float32)
+        row_scores = (self.matrix[:self.n_rows] @ query.T).max(axis=1)
+        book_scores = np.maximum.reduceat(row_scores, self.offsets[:self.n_books])
+        book_scores[~self.alive[:self.n_books]] = -np.inf
+        return book_scores
+
+    def scores_many(self, book_ids, budget=2 ** 26):
+        # a (books, len(book_ids)) score matrix from matrix-to-matrix products; the asked
+        # books are processed in chunks so one product stays under budget floats
+        queries = [self.vectors(book_id) for book_id in book_ids]
+        lengths = np.array([len(query) for query in queries], dtype=np.int64)
+        scores = np.empty((self.n_books, len(book_ids)), dtype=np.float32)
+        start = 0
+        while start < len(book_ids):
+            stop = start + 1
+            while stop < len(book_ids) and lengths[start:stop + 1].sum() * max(self.n_rows, 1) <= budget:
+                stop += 1
+            query = np.concatenate(queries[start:stop])
+            row_scores = self.matrix[:self.n_rows] @ query.T
+            # max over the keywords of each asked book, then over the rows of each stored book
+            row_scores = np.maximum.reduceat(row_scores, np.cumsum(lengths[start:stop]) - lengths[start:stop], axis=1)
+            scores[:, start:stop] = np.maximum.reduceat(row_scores, self.offsets[:self.n_books], axis=0)
+            start = stop
+        scores[~self.alive[:self.n_books]] = -np.inf
+        return scores
+
+    def most_similar_many(self, book_ids, k):
+        scores = self.scores_many(book_ids)
+        return [self.ids[self.top(scores[:, column], k)].tolist() for column in range(len(book_ids))]
+
+    def top(self, scores, k, positions=None):
+        # positions of the k best scores; equal scores keep insertion order like heapq.nlargest.
+        # scores either cover every position or only the given (sorted) positions
+        if positions is None:
+            positions = np.arange(len(scores))
+            k = min(k, len(self))
+        k = min(k, len(positions))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+        order = np.lexsort((positions[candidates], -scores[candidates]))
+        return positions[candidates[order[:k]]]
+
+    def most_similar(self, book_id, k):
+        top = self.top(self.scores(self.vectors(book_id)), k)
+        return self.ids[top].tolist()